@@ -63,35 +63,68 @@
 # 			result.append(str(pair[1]))
 # 	return result
 
+import numpy
+
+# Decoded symbol value for an invalid (non-transitioning) Manchester pair,
+# shown as 'X' in decoded strings.
+INVALID = 2
+
+_symbol_chars = numpy.frombuffer(b'01X', dtype=numpy.uint8)
+
+def string_to_bits(s):
+	return numpy.frombuffer(s.encode('ascii'), dtype=numpy.uint8) - ord('0')
+
+def bits_to_string(bits):
+	return _symbol_chars[bits].tobytes().decode('ascii')
+
+def _symbol_pairs(bits):
+	# Splits the last axis of bits into first and second halves of each
+	# 2-bit symbol. A trailing odd bit is dropped, and reported.
+	bits = numpy.asarray(bits, dtype=numpy.uint8)
+	pairs_length = (bits.shape[-1] // 2) * 2
+	return bits[..., 0:pairs_length:2], bits[..., 1:pairs_length:2], bits.shape[-1] % 2 == 1
+
+def _append_invalid(result, odd):
+	if odd:
+		invalid = numpy.full(result.shape[:-1] + (1,), INVALID, dtype=numpy.uint8)
+		result = numpy.concatenate((result, invalid), axis=-1)
+	return result
+
+def manchester_decode_bits(bits):
+	# Decodes uint8 bits along the last axis, so a (packets x bits) array is
+	# decoded in one call. Invalid symbols are INVALID.
+	first, second, odd = _symbol_pairs(bits)
+	result = numpy.where(first == second, INVALID, second).astype(numpy.uint8)
+	return _append_invalid(result, odd)
+
+def differential_manchester_decode_bits(bits):
+	first, second, odd = _symbol_pairs(bits)
+	# Each symbol is compared with the second half of the one before it
+	# (valid or not), starting from 0.
+	last = numpy.zeros(second.shape, dtype=numpy.uint8)
+	last[..., 1:] = second[..., :-1]
+	result = numpy.where(first == second, INVALID, (last == first).astype(numpy.uint8)).astype(numpy.uint8)
+	return _append_invalid(result, odd)
+
+def truncate_invalid(symbols):
+	# Symbols up to the first INVALID one.
+	invalid = numpy.flatnonzero(symbols == INVALID)
+	if len(invalid):
+		return symbols[:invalid[0]]
+	return symbols
+
+# Payload decoders by --encoding name: symbol arrays in, bit arrays out.
+decoders = {
+	'man': manchester_decode_bits,
+	'diffman': differential_manchester_decode_bits,
+	'raw': lambda bits: bits,
+}
+
 def string_to_symbols(s, symbol_length):
 	return [s[n:n+symbol_length] for n in range(0, len(s), symbol_length)]
 
 def differential_manchester_decode(s):
-	symbols = string_to_symbols(s, 2)
-	last_bit = '0'
-	result = []
-	for symbol in symbols:
-		if len(symbol) == 2:
-			if symbol[0] == symbol[1]:
-				result.append('X')
-			elif last_bit != symbol[0]:
-				result.append('0')
-			else:
-				result.append('1')
-			last_bit = symbol[1]
-		else:
-			result.append('X')
-	return ''.join(result)
+	return bits_to_string(differential_manchester_decode_bits(string_to_bits(s)))
 
 def manchester_decode(s):
-	symbols = string_to_symbols(s, 2)
-	result = []
-	for symbol in symbols:
-		if len(symbol) == 2:
-			if symbol[0] == symbol[1]:
-				result.append('X')
-			else:
-				result.append(symbol[1])
-		else:
-			result.append('X')
-	return ''.join(result)
\ No newline at end of file
+	return bits_to_string(manchester_decode_bits(string_to_bits(s)))
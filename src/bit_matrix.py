@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2013 Jared Boone
+#
+# This file is part of the TPMS project.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# Packet payloads as a 2-D bit matrix, for whole-column statistics.
+
+from collections import defaultdict
+
+import numpy
+
+class BitMatrix(object):
+	# Rows are payloads (usually unique ones), with a count each. bits is a
+	# (rows x width) uint8 matrix, zero past each row's length.
+	def __init__(self, bits, lengths, counts):
+		self.bits = bits
+		self.lengths = lengths
+		self.counts = counts
+
+	@classmethod
+	def from_payloads(cls, payloads, counts=None):
+		# payloads are PackedBits.
+		lengths = numpy.array([len(payload) for payload in payloads], dtype=numpy.int64)
+		width = int(lengths.max()) if len(lengths) else 0
+		packed = numpy.zeros((len(payloads), (width + 7) // 8), dtype=numpy.uint8)
+		for n, payload in enumerate(payloads):
+			packed[n, :len(payload.packed)] = payload.packed
+		bits = numpy.unpackbits(packed, axis=1)[:, :width]
+		if counts is None:
+			counts = numpy.ones((len(payloads),), dtype=numpy.int64)
+		return cls(bits, lengths, numpy.asarray(counts, dtype=numpy.int64))
+
+	@classmethod
+	def from_counts(cls, payload_counts):
+		# From a {PackedBits: count} mapping.
+		payloads = list(payload_counts.keys())
+		return cls.from_payloads(payloads, [payload_counts[payload] for payload in payloads])
+
+	def __len__(self):
+		return len(self.lengths)
+
+	@property
+	def width(self):
+		return self.bits.shape[1]
+
+	def _weights(self, weighted):
+		if weighted:
+			return self.counts
+		return numpy.ones((len(self),), dtype=numpy.int64)
+
+	def bit_counts(self, weighted=True):
+		# Returns (ones, totals) per bit index: weighted column sums, over
+		# the rows long enough to have that bit.
+		weights = self._weights(weighted).astype(numpy.float64)
+		ones = numpy.zeros((self.width,), dtype=numpy.float64)
+		# Converting a block of rows at a time bounds the temporary copy.
+		for start in range(0, len(self), 65536):
+			block = self.bits[start:start + 65536]
+			ones += numpy.dot(weights[start:start + 65536], block.astype(numpy.float32))
+		length_weights = numpy.bincount(self.lengths, weights=weights, minlength=self.width + 1)
+		totals = numpy.cumsum(length_weights[::-1])[::-1][1:self.width + 1]
+		return numpy.round(ones).astype(numpy.int64), numpy.round(totals).astype(numpy.int64)
+
+	def range_keys(self, start, stop):
+		# Bits start:stop of each row, with a 1 bit in front, as an integer.
+		# The leading 1 keeps keys of rows shorter than stop (which give
+		# narrower values, as slicing would) distinct from longer ones.
+		width = max(0, min(stop, self.width) - start)
+		if width > 62:
+			keys = numpy.ones((len(self),), dtype=object)
+		else:
+			keys = numpy.ones((len(self),), dtype=numpy.int64)
+		for k in range(width):
+			column = self.bits[:, start + k].astype(keys.dtype)
+			has_bit = self.lengths > start + k
+			keys = numpy.where(has_bit, (keys << 1) | column, keys)
+		return keys
+
+	def range_histogram(self, start, stop, weighted=True):
+		# Returns {(width, value): count} over bits start:stop.
+		weights = self._weights(weighted)
+		keys = self.range_keys(start, stop)
+		if keys.dtype == object:
+			histogram = defaultdict(int)
+			for key, weight in zip(keys.tolist(), weights.tolist()):
+				histogram[key] += weight
+			items = histogram.items()
+		else:
+			unique_keys, inverse = numpy.unique(keys, return_inverse=True)
+			counts = numpy.bincount(inverse.ravel(), weights=weights, minlength=len(unique_keys))
+			items = zip(unique_keys.tolist(), numpy.round(counts).astype(numpy.int64).tolist())
+		return dict((split_range_key(key), count) for key, count in items)
+
+	def byte_histograms(self, offset=0, weighted=True):
+		# Returns a (ranges x 256) array: for each byte-aligned range
+		# offset + 8 * n, the count of each byte value, over rows that
+		# contain the whole byte.
+		weights = self._weights(weighted)
+		range_count = max(0, (self.width - offset) // 8)
+		columns = self.bits[:, offset:offset + range_count * 8].reshape((len(self), range_count, 8))
+		byte_values = numpy.packbits(columns, axis=2).reshape((len(self), range_count))
+		histograms = numpy.zeros((range_count, 256), dtype=numpy.int64)
+		for n in range(range_count):
+			valid = self.lengths >= offset + (n + 1) * 8
+			histograms[n] = numpy.bincount(byte_values[valid, n], weights=weights[valid], minlength=256)
+		return histograms
+
+def split_range_key(key):
+	# Inverse of the leading 1 in BitMatrix.range_keys: (width, value).
+	width = int(key).bit_length() - 1
+	return width, int(key) - (1 << width)
+
+def format_range_key(key):
+	# (width, value) as the bit string it was sliced from.
+	width, value = key
+	if width == 0:
+		return ''
+	return format(value, '0%db' % width)
+
+def add_padded(total, values):
+	# total + values, growing total with zeros if values is longer.
+	if len(values) > len(total):
+		grown = numpy.zeros((len(values),) + total.shape[1:], dtype=total.dtype)
+		grown[:len(total)] = total
+		total = grown
+	total[:len(values)] += values
+	return total
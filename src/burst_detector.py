@@ -24,6 +24,7 @@
 # Burst detection
 
 import math
+import os.path
 
 from gnuradio import gr
 
@@ -31,10 +32,13 @@ import numpy
 import scipy.signal
 import pyfftw
 
+from burst_scan import block_spreads, hysteresis_counts, NoiseFloorTracker
+
 # http://gnuradio.org/redmine/projects/gnuradio/wiki/BlocksCodingGuide
 
 class burst_detector(gr.basic_block):
-	def __init__(self):
+	def __init__(self, batch=False, block_size=256, hysteresis_timeout=3, threshold_rise=10, threshold_fall=5,
+			adaptive=False, noise_alpha=0.001, rise_factor=3.0, fall_factor=1.5):
 		super(burst_detector, self).__init__(
 			name="Burst Detector",
 			in_sig=[numpy.complex64],
@@ -44,22 +48,50 @@ class burst_detector(gr.basic_block):
 		self._burst_tag_symbol = gr.pmt.string_to_symbol('burst')
 		self._burst = False
 
-		self.block_size = 256
+		self.block_size = block_size
 		
-		self.hysteresis_timeout = 3 #int(math.ceil(768 / self.block_size))
+		self.hysteresis_timeout = hysteresis_timeout #int(math.ceil(768 / self.block_size))
 		self.hysteresis_count = 0
 
-		self.fft_window = scipy.signal.hanning(self.block_size)
-		self.fft_in = pyfftw.n_byte_align_empty((self.block_size,), self.block_size, dtype='complex64')
-		self.fft_out = pyfftw.n_byte_align_empty((self.block_size,), self.block_size, dtype='complex64')
+		self.threshold_rise = threshold_rise
+		self.threshold_fall = threshold_fall
+
+		# Adaptive mode: thresholds follow a running noise floor estimate.
+		self.adaptive = adaptive
+		self.noise_floor = NoiseFloorTracker(threshold_rise, threshold_fall, noise_alpha, rise_factor, fall_factor)
+
+		self.fft_window = scipy.signal.windows.hann(self.block_size, sym=True)
+		self.fft_in = pyfftw.empty_aligned((self.block_size,), dtype='complex64', n=self.block_size)
+		self.fft_out = pyfftw.empty_aligned((self.block_size,), dtype='complex64', n=self.block_size)
 		self.fft = pyfftw.FFTW(self.fft_in, self.fft_out)
 
+		# Batch mode: one (blocks x block_size) pyfftw plan per block count seen.
+		self.batch = batch
+		self._batch_plans = {}
+
 	def forecast(self, noutput_items, ninput_items_required):
 		block_count = int(math.ceil(float(noutput_items) / self.block_size))
 		ninput_items_required[0] = block_count * self.block_size
 		#print('for %d items, require %d' % (noutput_items, ninput_items_required[0]))
 
+	def _thresholds(self, spreads):
+		if self.adaptive:
+			return self.noise_floor.thresholds(spreads)
+		else:
+			return self.threshold_rise, self.threshold_fall
+
+	def _batch_plan(self, block_count):
+		if block_count not in self._batch_plans:
+			shape = (block_count, self.block_size)
+			fft_in = pyfftw.empty_aligned(shape, dtype='complex64', n=self.block_size)
+			fft_out = pyfftw.empty_aligned(shape, dtype='complex64', n=self.block_size)
+			self._batch_plans[block_count] = pyfftw.FFTW(fft_in, fft_out, axes=(1,))
+		return self._batch_plans[block_count]
+
 	def general_work(self, input_items, output_items):
+		if self.batch:
+			return self._general_work_batch(input_items, output_items)
+
 		input_item = input_items[0]
 		
 		samples_to_consume = min(len(input_items[0]), len(output_items[0]))
@@ -83,9 +115,10 @@ class burst_detector(gr.basic_block):
 			#graph = '*' * int(round(block_spread))
 			#print('%.1f %s' % (block_spread, graph))
 			
-			if block_spread >= 10:
+			threshold_rise, threshold_fall = self._thresholds(numpy.array([block_spread]))
+			if block_spread >= threshold_rise:
 				self.hysteresis_count = self.hysteresis_timeout
-			elif block_spread < 5:
+			elif block_spread < threshold_fall:
 				self.hysteresis_count -= 1
 				
 			#if block_max >= self.threshold_rise:
@@ -112,3 +145,101 @@ class burst_detector(gr.basic_block):
 		self.consume_each(samples_to_consume)
 
 		return samples_to_consume
+
+	def _general_work_batch(self, input_items, output_items):
+		samples_to_consume = min(len(input_items[0]), len(output_items[0]))
+		block_count = int(math.floor(samples_to_consume / self.block_size))
+		samples_to_consume = block_count * self.block_size
+
+		if block_count > 0:
+			blocks = input_items[0][:samples_to_consume].reshape((block_count, self.block_size))
+			fft = self._batch_plan(block_count)
+			fft.input_array[:] = blocks * self.fft_window
+			fft()
+
+			spreads = block_spreads(fft.output_array)
+			threshold_rise, threshold_fall = self._thresholds(spreads)
+			counts = hysteresis_counts(spreads, self.hysteresis_count, self.hysteresis_timeout, threshold_rise, threshold_fall)
+			self.hysteresis_count = int(counts[-1])
+			self._tag_transitions(counts > 0)
+
+		output_items[0][:samples_to_consume] = input_items[0][:samples_to_consume]
+
+		self.consume_each(samples_to_consume)
+
+		return samples_to_consume
+
+	def _tag_transitions(self, active):
+		nitems_written = self.nitems_written(0)
+
+		previous = numpy.empty_like(active)
+		previous[0] = self._burst
+		previous[1:] = active[:-1]
+		if nitems_written == 0 and len(active) > 1 and not self._burst:
+			# The very first block can't be tagged (its tag would precede
+			# the stream), so the burst opens on the following block.
+			previous[1] = False
+
+		for block_n in numpy.flatnonzero(active != previous):
+			index_start = int(block_n) * self.block_size
+			if active[block_n]:
+				if self._burst == False:
+					tag_sample_index = nitems_written + index_start - self.block_size
+					if tag_sample_index >= 0:
+						self.add_item_tag(0, tag_sample_index, self._burst_tag_symbol, gr.pmt.PMT_T)
+						self._burst = True
+			else:
+				if self._burst == True:
+					self.add_item_tag(0, nitems_written + index_start, self._burst_tag_symbol, gr.pmt.PMT_F)
+					self._burst = False
+
+class tagged_burst_sink(gr.sync_block):
+	# Like blocks.tagged_file_sink, writes each 'burst'-tagged span to its own
+	# file<id>_<n>_<seconds>.dat, but into output_path rather than the
+	# working directory, so callers don't need to chdir.
+	def __init__(self, output_path, samp_rate):
+		super(tagged_burst_sink, self).__init__(
+			name="Tagged Burst Sink",
+			in_sig=[numpy.complex64],
+			out_sig=None
+		)
+
+		self._burst_tag_symbol = gr.pmt.string_to_symbol('burst')
+		self.output_path = output_path
+		self.samp_rate = samp_rate
+		self.burst_count = 0
+		self._file = None
+
+	def _burst_path(self, start_sample):
+		filename = 'file%d_%d_%.8f.dat' % (self.unique_id(), self.burst_count, start_sample / float(self.samp_rate))
+		return os.path.join(self.output_path, filename)
+
+	def work(self, input_items, output_items):
+		samples = input_items[0]
+		nitems_read = self.nitems_read(0)
+		tags = self.get_tags_in_range(0, nitems_read, nitems_read + len(samples), self._burst_tag_symbol)
+
+		index = 0
+		for tag in sorted(tags, key=lambda tag: tag.offset):
+			offset = int(tag.offset - nitems_read)
+			if self._file is not None:
+				samples[index:offset].tofile(self._file)
+			index = offset
+			if gr.pmt.is_true(tag.value):
+				if self._file is None:
+					self._file = open(self._burst_path(tag.offset), 'wb')
+			elif self._file is not None:
+				self._file.close()
+				self._file = None
+				self.burst_count += 1
+		if self._file is not None:
+			samples[index:].tofile(self._file)
+
+		return len(samples)
+
+	def stop(self):
+		if self._file is not None:
+			self._file.close()
+			self._file = None
+			self.burst_count += 1
+		return True
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2013 Jared Boone
+#
+# This file is part of the TPMS project.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+# Burst index files.
+#
+# Instead of copying every burst out to its own .dat file, a single index
+# of burst sample offsets is written next to the capture. Bursts are then
+# read as slices of the memory-mapped capture, without copying.
+
+import sys
+import os.path
+import datetime
+from argparse import ArgumentParser
+
+import numpy
+import pytz
+
+from burst_scan import BurstScanner, open_capture, add_detector_arguments, detector_settings
+
+burst_index_dtype = numpy.dtype([
+	('start_sample', numpy.int64),
+	('length', numpy.int64),
+	('peak_spread', numpy.float32),
+	('timestamp', numpy.int64),		# Nanoseconds since the Unix epoch, UTC.
+])
+
+epoch = pytz.utc.localize(datetime.datetime(1970, 1, 1))
+
+def timestamp_to_ns(timestamp):
+	delta = timestamp - epoch
+	return ((delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds) * 1000
+
+def ns_to_timestamp(ns):
+	return epoch + datetime.timedelta(microseconds=int(ns) // 1000)
+
+def parse_frequency(value):
+	if value[-1].upper() == 'M':
+		return float(value[:-1]) * 1e6
+	else:
+		raise RuntimeError('Unsupported frequency "%s"' % value)
+
+def format_frequency(value):
+	# Inverse of parse_frequency, keeping at least kHz resolution.
+	megahertz = ('%.6f' % (value / 1e6)).rstrip('0')
+	integer, fraction = megahertz.split('.')
+	return '%s.%sm' % (integer, fraction.ljust(3, '0'))
+
+def parse_capture_filename(path):
+	# <target>_<carrier>_<sampling rate>_<date>_<time>_<device>.cfile
+	# Returns (carrier_frequency, sampling_rate, start_timestamp).
+	source_directory, source_filename = os.path.split(path)
+	source_filename, source_extension = os.path.splitext(source_filename)
+	target_signal, carrier_freq, sampling_rate, start_date, start_time, capture_device = source_filename.split('_')
+
+	carrier_freq = parse_frequency(carrier_freq)
+	sampling_rate = parse_frequency(sampling_rate)
+
+	start_timestamp = datetime.datetime.strptime(start_date + ' ' + start_time, '%Y%m%d %H%M%Sz')
+	start_timestamp = pytz.utc.localize(start_timestamp)
+
+	return carrier_freq, sampling_rate, start_timestamp
+
+def index_path(capture_path):
+	capture_base, capture_extension = os.path.splitext(capture_path)
+	return '%s%s' % (capture_base, '.bursts.npz')
+
+def burst_reference(capture_path, start_sample):
+	return '%s@%d' % (capture_path, start_sample)
+
+def split_burst_reference(reference):
+	# Returns (capture_path, start_sample), or None if not a burst reference.
+	capture_path, separator, start_sample = reference.rpartition('@')
+	if separator and start_sample.isdigit():
+		return capture_path, int(start_sample)
+	else:
+		return None
+
+def has_burst_index(path):
+	return os.path.isfile(path) and os.path.exists(index_path(path))
+
+class BurstIndex(object):
+	def __init__(self, capture_path, bursts, sampling_rate, start_timestamp, center_frequency):
+		self.capture_path = capture_path
+		self.bursts = bursts
+		self.sampling_rate = sampling_rate
+		self.start_timestamp = start_timestamp
+		self.center_frequency = center_frequency
+		self._capture = None
+
+	@classmethod
+	def from_records(cls, capture_path, records, sampling_rate, start_timestamp, center_frequency, delay=0):
+		# delay is the capture's latency, in samples, behind the time the
+		# signal was received (for example, a filter's group delay).
+		bursts = numpy.empty((len(records),), dtype=burst_index_dtype)
+		bursts['start_sample'] = records['start_sample']
+		bursts['length'] = records['end_sample'] - records['start_sample']
+		bursts['peak_spread'] = records['peak_spread']
+		offset_ns = numpy.round((records['start_sample'] - delay) * (1e9 / sampling_rate)).astype(numpy.int64)
+		bursts['timestamp'] = timestamp_to_ns(start_timestamp) + offset_ns
+		return cls(capture_path, bursts, sampling_rate, start_timestamp, center_frequency)
+
+	@classmethod
+	def load(cls, capture_path):
+		index = numpy.load(index_path(capture_path))
+		if 'center_frequency' in index.files:
+			center_frequency = float(index['center_frequency'])
+		else:
+			# Indexes written before center_frequency was stored.
+			try:
+				center_frequency = parse_capture_filename(capture_path)[0]
+			except (RuntimeError, ValueError):
+				center_frequency = None
+		return cls(
+			capture_path,
+			index['bursts'],
+			float(index['sampling_rate']),
+			ns_to_timestamp(index['start_timestamp']),
+			center_frequency,
+		)
+
+	def save(self):
+		f_index = open(index_path(self.capture_path), 'wb')
+		numpy.savez(f_index,
+			bursts=self.bursts,
+			sampling_rate=numpy.float64(self.sampling_rate),
+			start_timestamp=numpy.int64(timestamp_to_ns(self.start_timestamp)),
+			center_frequency=numpy.float64(self.center_frequency),
+		)
+		f_index.close()
+
+	@property
+	def capture(self):
+		if self._capture is None:
+			self._capture = open_capture(self.capture_path)
+		return self._capture
+
+	def __len__(self):
+		return len(self.bursts)
+
+	def find(self, start_sample):
+		n = numpy.searchsorted(self.bursts['start_sample'], start_sample)
+		if n < len(self.bursts) and self.bursts['start_sample'][n] == start_sample:
+			return n
+		raise KeyError(start_sample)
+
+	def samples(self, n):
+		burst = self.bursts[n]
+		return self.capture[burst['start_sample']:burst['start_sample'] + burst['length']]
+
+	def timestamp(self, n):
+		return ns_to_timestamp(self.bursts['timestamp'][n])
+
+	def reference(self, n):
+		return burst_reference(self.capture_path, self.bursts['start_sample'][n])
+
+	def remove(self, n):
+		self.bursts = numpy.delete(self.bursts, n)
+
+	def __iter__(self):
+		for n in range(len(self.bursts)):
+			yield self.reference(n), self.timestamp(n), self.samples(n)
+
+def index_capture(capture_path, jobs=1, **scanner_args):
+	carrier_freq, sampling_rate, start_timestamp = parse_capture_filename(capture_path)
+	records = BurstScanner(**scanner_args).scan_file(capture_path, jobs)
+	index = BurstIndex.from_records(capture_path, records, sampling_rate, start_timestamp, carrier_freq)
+	index.save()
+	return index
+
+# Indexes opened by cached_index(), by capture path, with the index file's
+# (mtime, size) when loaded, so an index rewritten elsewhere is reloaded.
+loaded_indexes = {}
+
+def _index_version(capture_path):
+	status = os.stat(index_path(capture_path))
+	return status.st_mtime, status.st_size
+
+def cached_index(capture_path):
+	version = _index_version(capture_path)
+	cached = loaded_indexes.get(capture_path)
+	if cached is None or cached[0] != version:
+		cached = (version, BurstIndex.load(capture_path))
+		loaded_indexes[capture_path] = cached
+	return cached[1]
+
+def load_burst(reference):
+	# Load a burst by .dat file path or by indexed burst reference.
+	split = split_burst_reference(reference)
+	if split is None:
+		return numpy.fromfile(reference, dtype=numpy.complex64)
+	capture_path, start_sample = split
+	index = cached_index(capture_path)
+	return index.samples(index.find(start_sample))
+
+def delete_burst(reference):
+	capture_path, start_sample = split_burst_reference(reference)
+	index = cached_index(capture_path)
+	index.remove(index.find(start_sample))
+	index.save()
+	loaded_indexes[capture_path] = (_index_version(capture_path), index)
+
+if __name__ == '__main__':
+	parser = ArgumentParser()
+	parser.add_argument('capture', nargs='+', type=str, help="Complex64 capture files (.cfile)")
+	parser.add_argument('-j', '--jobs', type=int, default=1, help="Worker processes scanning chunks of each capture")
+	add_detector_arguments(parser)
+	args = parser.parse_args()
+
+	for capture_path in args.capture:
+		index = index_capture(capture_path, jobs=args.jobs, **detector_settings(args))
+		print('%s: %d bursts' % (index_path(capture_path), len(index)))
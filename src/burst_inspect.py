@@ -40,6 +40,8 @@ from gnuradio import gr
 from gnuradio import digital
 
 from numpy_block import NumpySource, NumpySink
+from burst_index import BurstIndex, has_burst_index, split_burst_reference, load_burst, delete_burst
+from spectrum import burst_spectrum
 #from packet import packet_classify
 
 class TimeData(object):
@@ -594,8 +596,7 @@ class SpectrumView(QtGui.QWidget):
 	def burst(self, value):
 		self._burst = value
 		if self.burst is not None:
-			windowed_samples = self.burst.samples * scipy.signal.hanning(len(self.burst.samples))
-			spectrum = numpy.fft.fftshift(numpy.fft.fft(windowed_samples))
+			spectrum = burst_spectrum(self.burst.samples)
 			self._mag_spectrum = numpy.log(numpy.absolute(spectrum))
 			self._burst_max = max(self._mag_spectrum)
 		self.update()
@@ -667,6 +668,9 @@ class SpectrumView(QtGui.QWidget):
 		return QtCore.QSize(50, 50)
 
 def get_cfile_list(path):
+	if has_burst_index(path):
+		index = BurstIndex.load(path)
+		return [index.reference(n) for n in range(len(index))]
 	path_glob = os.path.join(path, 'file*.dat')
 	#path_glob = os.path.join(path, '*.cfile')
 	filenames = glob.glob(path_glob)
@@ -910,7 +914,7 @@ class ASKWidget(QtGui.QWidget):
 			sample_and_hold = blocks.sample_and_hold_ff()
 			multiply_const = blocks.multiply_const_vff((0.5, ))
 			subtract = blocks.sub_ff(1)
-			numpy_sink = NumpySink(numpy.float32)
+			numpy_sink = NumpySink(numpy.float32, len(data_source))
 			top = gr.top_block()
 			top.connect((numpy_source, 0), (peak_detector, 0))
 			top.connect((numpy_source, 0), (sample_and_hold, 0))
@@ -1144,7 +1148,13 @@ class Browser(QtGui.QWidget):
 	@property
 	def metadata_filename(self):
 		if self.file_path:
-			file_basename, file_extension = os.path.splitext(self.file_path)
+			reference = split_burst_reference(self.file_path)
+			if reference:
+				capture_path, start_sample = reference
+				capture_basename, capture_extension = os.path.splitext(capture_path)
+				file_basename = '%s_%d' % (capture_basename, start_sample)
+			else:
+				file_basename, file_extension = os.path.splitext(self.file_path)
 			return '%s%s' % (file_basename, '.yaml')
 		else:
 			return None
@@ -1187,11 +1197,14 @@ class Browser(QtGui.QWidget):
 					self.tab_fsk.modulation.deviation = modulation['deviation']
 					self.modulation_tabs.setCurrentWidget(self.tab_fsk)
 
-		data = numpy.fromfile(file_path, dtype=numpy.complex64)
+		data = load_burst(file_path)
 		sampling_rate = 400e3
 		self.burst.raw = TimeData(data, sampling_rate)
 
 	def delete_file(self, file_path):
+		if split_burst_reference(file_path):
+			delete_burst(file_path)
+			return
 		file_base, file_ext = os.path.splitext(file_path)
 		file_glob = '%s%s' % (file_base, '.*')
 		for matched_file_path in glob.glob(file_glob):
@@ -1214,7 +1227,7 @@ class Browser(QtGui.QWidget):
 		data_source = filtered_symbols.samples
 		numpy_source = NumpySource(data_source)
 		clock_recovery = digital.clock_recovery_mm_ff(omega, self._gain_omega, mu, self._gain_mu, self._omega_relative_limit)
-		numpy_sink = NumpySink(numpy.float32)
+		numpy_sink = NumpySink(numpy.float32, int(math.ceil(len(data_source) / omega)) + 1)
 		top = gr.top_block()
 		top.connect(numpy_source, clock_recovery)
 		top.connect(clock_recovery, numpy_sink)
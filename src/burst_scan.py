@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2013 Jared Boone
+#
+# This file is part of the TPMS project.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+# Offline burst detection, without GNU Radio.
+#
+# Applies the same FFT spread and hysteresis rule as burst_detector, over
+# large chunks of a memory-mapped capture file.
+
+import sys
+import multiprocessing
+from argparse import ArgumentParser
+
+import numpy
+import scipy.signal
+import pyfftw
+
+burst_record_dtype = numpy.dtype([
+	('start_sample', numpy.int64),
+	('end_sample', numpy.int64),
+	('peak_spread', numpy.float32),
+])
+
+def block_spreads(spectra):
+	# Peak-to-average magnitude ratio of each row of a (blocks x block_size) spectrum matrix.
+	spectra_abs = numpy.abs(spectra)
+	block_max = numpy.max(spectra_abs, axis=1)
+	block_avg = numpy.sum(spectra_abs, axis=1) / spectra.shape[1]
+	return block_max / block_avg
+
+def hysteresis_counts(spreads, count, timeout, threshold_rise=10, threshold_fall=5):
+	# Vectorized equivalent of the per-block rule:
+	#
+	#	if spread >= threshold_rise:  count = timeout
+	#	elif spread < threshold_fall: count -= 1
+	#
+	# Returns the hysteresis count after each block.
+	rise = spreads >= threshold_rise
+	fall = (spreads < threshold_fall) & ~rise
+	falls = numpy.cumsum(fall)
+	index = numpy.arange(len(spreads))
+	last_rise = numpy.maximum.accumulate(numpy.where(rise, index, -1))
+	risen = last_rise >= 0
+	falls_since_rise = falls - numpy.where(risen, falls[numpy.maximum(last_rise, 0)], 0)
+	return numpy.where(risen, timeout, count) - falls_since_rise
+
+class NoiseFloorTracker(object):
+	# Exponential moving average of the block spread. Rise and fall
+	# thresholds scale with the noise floor, but never drop below the
+	# fixed thresholds, so noisy captures raise the bar for a burst.
+	#
+	# The floor starts from the median of the first spreads seen, but no
+	# higher than the floor the fixed thresholds imply, so a capture that
+	# opens mid-burst starts out like fixed thresholds. Spreads are clipped
+	# to the fall threshold before averaging, so bursts barely move it,
+	# while a floor that is really higher still ratchets up to it.
+	def __init__(self, threshold_rise=10, threshold_fall=5, alpha=0.001, rise_factor=3.0, fall_factor=1.5):
+		self.threshold_rise = threshold_rise
+		self.threshold_fall = threshold_fall
+		self.alpha = alpha
+		self.rise_factor = rise_factor
+		self.fall_factor = fall_factor
+		self.level = None
+
+	def thresholds(self, spreads):
+		# Returns per-block (rise, fall) thresholds, each derived from the
+		# noise floor as it stood before that block, and advances the floor.
+		if len(spreads) == 0:
+			return self.threshold_rise, self.threshold_fall
+		if self.level is None:
+			self.level = min(
+				float(numpy.median(spreads)),
+				self.threshold_rise / self.rise_factor,
+				self.threshold_fall / self.fall_factor,
+			)
+
+		# The clip level is refreshed once per time constant.
+		segment_length = max(1, int(1.0 / self.alpha))
+		floor = numpy.empty((len(spreads),), dtype=numpy.float64)
+		for start in range(0, len(spreads), segment_length):
+			segment = spreads[start:start + segment_length]
+			clip = max(self.threshold_fall, self.level * self.fall_factor)
+			levels, zf = scipy.signal.lfilter([self.alpha], [1.0, self.alpha - 1.0], numpy.minimum(segment, clip), zi=[(1.0 - self.alpha) * self.level])
+			floor[start] = self.level
+			floor[start + 1:start + len(segment)] = levels[:-1]
+			self.level = float(levels[-1])
+
+		return (
+			numpy.maximum(self.threshold_rise, floor * self.rise_factor),
+			numpy.maximum(self.threshold_fall, floor * self.fall_factor),
+		)
+
+def open_capture(path):
+	return numpy.memmap(path, dtype=numpy.complex64, mode='r')
+
+class BurstScanner(object):
+	def __init__(self, block_size=256, hysteresis_timeout=3, threshold_rise=10, threshold_fall=5,
+			adaptive=False, noise_alpha=0.001, rise_factor=3.0, fall_factor=1.5, chunk_blocks=4096):
+		self.block_size = block_size
+		self.hysteresis_timeout = hysteresis_timeout
+		self.threshold_rise = threshold_rise
+		self.threshold_fall = threshold_fall
+		self.adaptive = adaptive
+		self.noise_alpha = noise_alpha
+		self.rise_factor = rise_factor
+		self.fall_factor = fall_factor
+		self.chunk_blocks = chunk_blocks
+
+		self.noise_floor = NoiseFloorTracker(threshold_rise, threshold_fall, noise_alpha, rise_factor, fall_factor)
+
+		self.hysteresis_count = 0
+
+		self.fft_window = scipy.signal.windows.hann(self.block_size, sym=True)
+		self._plans = {}
+
+	@property
+	def settings(self):
+		return {
+			'block_size': self.block_size,
+			'hysteresis_timeout': self.hysteresis_timeout,
+			'threshold_rise': self.threshold_rise,
+			'threshold_fall': self.threshold_fall,
+			'adaptive': self.adaptive,
+			'noise_alpha': self.noise_alpha,
+			'rise_factor': self.rise_factor,
+			'fall_factor': self.fall_factor,
+			'chunk_blocks': self.chunk_blocks,
+		}
+
+	def _plan(self, block_count):
+		if block_count not in self._plans:
+			shape = (block_count, self.block_size)
+			fft_in = pyfftw.empty_aligned(shape, dtype='complex64', n=self.block_size)
+			fft_out = pyfftw.empty_aligned(shape, dtype='complex64', n=self.block_size)
+			self._plans[block_count] = pyfftw.FFTW(fft_in, fft_out, axes=(1,))
+		return self._plans[block_count]
+
+	def spreads(self, samples):
+		block_count = len(samples) // self.block_size
+		result = numpy.empty((block_count,), dtype=numpy.float32)
+		for chunk_start in range(0, block_count, self.chunk_blocks):
+			chunk_end = min(chunk_start + self.chunk_blocks, block_count)
+			blocks = samples[chunk_start * self.block_size:chunk_end * self.block_size]
+			fft = self._plan(chunk_end - chunk_start)
+			fft.input_array[:] = blocks.reshape((-1, self.block_size)) * self.fft_window
+			fft()
+			result[chunk_start:chunk_end] = block_spreads(fft.output_array)
+		return result
+
+	def _thresholds(self, spreads):
+		if self.adaptive:
+			return self.noise_floor.thresholds(spreads)
+		else:
+			return self.threshold_rise, self.threshold_fall
+
+	def bursts(self, spreads):
+		threshold_rise, threshold_fall = self._thresholds(spreads)
+		counts = hysteresis_counts(spreads, 0, self.hysteresis_timeout, threshold_rise, threshold_fall)
+		if len(counts) > 0:
+			self.hysteresis_count = int(counts[-1])
+		active = counts > 0
+		if len(active) > 0:
+			# burst_detector can't tag a burst starting before the first sample,
+			# so a burst active on the very first block opens on the next one.
+			active[0] = False
+
+		edges = numpy.diff(active.astype(numpy.int8), prepend=0, append=0)
+		rise_blocks = numpy.flatnonzero(edges == 1)
+		fall_blocks = numpy.flatnonzero(edges == -1)
+
+		records = numpy.empty((len(rise_blocks),), dtype=burst_record_dtype)
+		records['start_sample'] = (rise_blocks - 1) * self.block_size
+		records['end_sample'] = fall_blocks * self.block_size
+		records['peak_spread'] = [spreads[rise:fall].max() for rise, fall in zip(rise_blocks, fall_blocks)]
+		return records
+
+	def scan(self, samples):
+		return self.bursts(self.spreads(samples))
+
+	def scan_file(self, path, jobs=1):
+		# Spreads depend only on their own block, so block-aligned chunks are
+		# scanned independently in worker processes. Hysteresis is carried
+		# across chunk boundaries by running it once over the joined spreads,
+		# which gives exactly the result of a serial scan.
+		capture = open_capture(path)
+		if jobs <= 1:
+			return self.scan(capture)
+
+		block_count = len(capture) // self.block_size
+		chunk_count = min(jobs * 4, max(1, block_count // self.chunk_blocks))
+		bounds = numpy.linspace(0, block_count, chunk_count + 1).astype(numpy.int64)
+		tasks = [(path, self.settings, bounds[n], bounds[n + 1]) for n in range(chunk_count)]
+
+		pool = multiprocessing.Pool(jobs)
+		spreads = pool.map(_scan_chunk_spreads, tasks)
+		pool.close()
+		pool.join()
+
+		return self.bursts(numpy.concatenate(spreads))
+
+def _scan_chunk_spreads(task):
+	path, settings, start_block, end_block = task
+	scanner = BurstScanner(**settings)
+	block_size = scanner.block_size
+	return scanner.spreads(open_capture(path)[start_block * block_size:end_block * block_size])
+
+def add_detector_arguments(parser):
+	parser.add_argument('--block-size', type=int, default=256, help="FFT block size, in samples")
+	parser.add_argument('--hysteresis-timeout', type=int, default=3, help="Quiet blocks before a burst ends")
+	parser.add_argument('--threshold-rise', type=float, default=10, help="Block spread that starts a burst")
+	parser.add_argument('--threshold-fall', type=float, default=5, help="Block spread below which a burst decays")
+	parser.add_argument('--adaptive', action='store_true', default=False, help="Scale thresholds with a running noise floor estimate")
+	parser.add_argument('--noise-alpha', type=float, default=0.001, help="Noise floor moving average coefficient, per block")
+	parser.add_argument('--rise-factor', type=float, default=3.0, help="Adaptive rise threshold, as a multiple of the noise floor")
+	parser.add_argument('--fall-factor', type=float, default=1.5, help="Adaptive fall threshold, as a multiple of the noise floor")
+
+def detector_settings(args):
+	return {
+		'block_size': args.block_size,
+		'hysteresis_timeout': args.hysteresis_timeout,
+		'threshold_rise': args.threshold_rise,
+		'threshold_fall': args.threshold_fall,
+		'adaptive': args.adaptive,
+		'noise_alpha': args.noise_alpha,
+		'rise_factor': args.rise_factor,
+		'fall_factor': args.fall_factor,
+	}
+
+def scan_capture(path, jobs=1, **kwargs):
+	return BurstScanner(**kwargs).scan_file(path, jobs)
+
+if __name__ == '__main__':
+	parser = ArgumentParser()
+	parser.add_argument('capture', type=str, help="Complex64 capture file (.cfile)")
+	parser.add_argument('--chunk-blocks', type=int, default=4096, help="FFT blocks processed per chunk")
+	parser.add_argument('-j', '--jobs', type=int, default=1, help="Worker processes scanning chunks of the capture")
+	add_detector_arguments(parser)
+	args = parser.parse_args()
+
+	records = scan_capture(args.capture, jobs=args.jobs, chunk_blocks=args.chunk_blocks, **detector_settings(args))
+	for record in records:
+		print('%d %d %.1f' % (record['start_sample'], record['end_sample'], record['peak_spread']))
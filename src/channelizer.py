@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2013 Jared Boone
+#
+# This file is part of the TPMS project.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+# Polyphase FFT filterbank channelizer.
+#
+# Splits a capture into N critically-sampled sub-channels, each at 1/N of
+# the capture sampling rate. In a single pass over the capture, every
+# channel is written out as a capture file of its own (named with the
+# channel's centre frequency and sampling rate) and scanned for bursts,
+# and a burst index is written for each channel.
+
+import os
+import os.path
+from argparse import ArgumentParser
+
+import numpy
+import scipy.signal
+
+from burst_scan import BurstScanner, open_capture, add_detector_arguments, detector_settings
+from burst_index import BurstIndex, parse_capture_filename, format_frequency, index_path
+
+class PolyphaseChannelizer(object):
+	def __init__(self, channel_count, taps_per_channel=16):
+		self.channel_count = channel_count
+		self.taps_per_channel = taps_per_channel
+
+		# Prototype low-pass filter, one channel wide. Row l, column p of the
+		# polyphase matrix holds tap l * channel_count + p.
+		if channel_count > 1:
+			taps = scipy.signal.firwin(channel_count * taps_per_channel, 1.0 / channel_count)
+			delay = (len(taps) - 1) / 2.0
+		else:
+			# One channel is the capture itself, unfiltered.
+			taps = numpy.zeros((taps_per_channel,))
+			taps[0] = 1.0
+			delay = 0.0
+		# Latency of the prototype filter, in output (channel) samples.
+		self.group_delay = delay / channel_count
+		self.taps = taps.reshape((taps_per_channel, channel_count)).astype(numpy.float32)
+
+		# Branch inputs from the previous call, for filter state.
+		self._history = numpy.zeros((taps_per_channel - 1, channel_count), dtype=numpy.complex64)
+		self._last_frame = numpy.zeros((channel_count,), dtype=numpy.complex64)
+
+	def channel_frequencies(self, sampling_rate):
+		# Centre frequency of each output channel, relative to the capture centre.
+		return numpy.fft.fftfreq(self.channel_count) * sampling_rate
+
+	def process(self, samples):
+		# Returns a (frames x channel_count) array; column k is channel k,
+		# decimated by channel_count. Trailing samples that don't fill a
+		# frame are ignored.
+		n = self.channel_count
+		frames = samples[:(len(samples) // n) * n].reshape((-1, n))
+		if len(frames) == 0:
+			return numpy.empty((0, n), dtype=numpy.complex64)
+
+		# Branch p sees x[m * n - p]: branch 0 the first sample of this
+		# frame, the others the tail of the previous frame, reversed.
+		branches = numpy.empty(frames.shape, dtype=numpy.complex64)
+		branches[:, 0] = frames[:, 0]
+		branches[0, 1:] = self._last_frame[:0:-1]
+		branches[1:, 1:] = frames[:-1, :0:-1]
+		self._last_frame = frames[-1].copy()
+
+		history_count = len(self._history)
+		extended = numpy.concatenate((self._history, branches))
+		filtered = numpy.zeros(frames.shape, dtype=numpy.complex64)
+		for l in range(self.taps_per_channel):
+			filtered += self.taps[l] * extended[history_count - l:len(extended) - l]
+		self._history = extended[len(extended) - history_count:]
+
+		return (numpy.fft.ifft(filtered, axis=1) * n).astype(numpy.complex64)
+
+def channel_capture_path(capture_path, output_path, carrier_freq, sampling_rate):
+	capture_directory, capture_filename = os.path.split(capture_path)
+	capture_basename, capture_extension = os.path.splitext(capture_filename)
+	fields = capture_basename.split('_')
+	fields[1] = format_frequency(carrier_freq)
+	fields[2] = format_frequency(sampling_rate)
+	return os.path.join(output_path, '%s%s' % ('_'.join(fields), capture_extension))
+
+def channelize_capture(capture_path, channel_count, output_path=None, taps_per_channel=16, chunk_blocks=4096, **scanner_args):
+	carrier_freq, sampling_rate, start_timestamp = parse_capture_filename(capture_path)
+	if output_path is None:
+		output_path = os.path.dirname(capture_path)
+
+	channelizer = PolyphaseChannelizer(channel_count, taps_per_channel)
+	channel_rate = sampling_rate / channel_count
+	channel_carriers = carrier_freq + channelizer.channel_frequencies(sampling_rate)
+	channel_paths = [channel_capture_path(capture_path, output_path, f, channel_rate) for f in channel_carriers]
+	# With one channel, the channel capture would be named the same as the
+	# capture it is read from.
+	for path in channel_paths:
+		if os.path.abspath(path) == os.path.abspath(capture_path):
+			raise RuntimeError('Channel capture "%s" would overwrite its source capture; choose another output directory' % path)
+
+	scanners = [BurstScanner(chunk_blocks=chunk_blocks, **scanner_args) for f in channel_carriers]
+	block_size = scanners[0].block_size
+	spreads = [[] for f in channel_carriers]
+
+	# Chunks are a whole number of detector blocks per channel, so no
+	# channel samples are left over between chunks.
+	chunk_samples = chunk_blocks * block_size * channel_count
+	capture = open_capture(capture_path)
+	channel_files = [open(path, 'wb') for path in channel_paths]
+	for chunk_start in range(0, len(capture), chunk_samples):
+		channels = channelizer.process(capture[chunk_start:chunk_start + chunk_samples]).T
+		for k in range(channel_count):
+			samples = numpy.ascontiguousarray(channels[k])
+			samples.tofile(channel_files[k])
+			spreads[k].append(scanners[k].spreads(samples))
+	for channel_file in channel_files:
+		channel_file.close()
+
+	indices = []
+	for k in range(channel_count):
+		records = scanners[k].bursts(numpy.concatenate(spreads[k]))
+		index = BurstIndex.from_records(channel_paths[k], records, channel_rate, start_timestamp, channel_carriers[k], channelizer.group_delay)
+		index.save()
+		indices.append(index)
+	return indices
+
+if __name__ == '__main__':
+	parser = ArgumentParser()
+	parser.add_argument('capture', nargs='+', type=str, help="Complex64 capture files (.cfile)")
+	parser.add_argument('-n', '--channels', type=int, default=8, help="Number of channels to split each capture into")
+	parser.add_argument('--taps-per-channel', type=int, default=16, help="Prototype filter length, per channel")
+	parser.add_argument('-o', '--output', type=str, default=None, help="Directory for channel captures (default: beside each capture)")
+	add_detector_arguments(parser)
+	args = parser.parse_args()
+
+	for capture_path in args.capture:
+		for index in channelize_capture(capture_path, args.channels, args.output, args.taps_per_channel, **detector_settings(args)):
+			print('%s: %.0f Hz, %d bursts' % (index_path(index.capture_path), index.center_frequency, len(index)))
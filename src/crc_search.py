@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2013 Jared Boone
+#
+# This file is part of the TPMS project.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# Vectorized search for the CRC or checksum protecting a packet field.
+#
+# A CRC is linear in its initial register value: the register after the
+# data is crc(data, init=0) xor a function of init and the data length
+# alone. So for packets of equal length, a polynomial and reflection setting
+# fit if crc(data, init=0) xor the packet's CRC field is the same value for
+# every packet, and that value then gives xorout for any choice of init.
+# This finds every init/xorout pair without enumerating them.
+
+import sys
+import multiprocessing
+from argparse import ArgumentParser
+
+import numpy
+
+from bit_coding import *
+from packet_input import iterate_packets, payload_bits
+
+crc_widths = (8, 16)
+checksum_kinds = ('sum', 'negsum', 'xor')
+
+def reflect_values(values, width):
+	values = numpy.asarray(values, dtype=numpy.int64)
+	result = numpy.zeros_like(values)
+	for n in range(width):
+		result |= ((values >> n) & 1) << (width - 1 - n)
+	return result
+
+reflected_bytes = reflect_values(numpy.arange(256), 8).astype(numpy.uint8)
+
+def crc_tables(polys, width):
+	# Byte-at-a-time lookup tables, one row per polynomial, for the
+	# non-reflected (MSB first) algorithm.
+	polys = numpy.asarray(polys, dtype=numpy.int64).reshape(-1, 1)
+	mask = (1 << width) - 1
+	top = 1 << (width - 1)
+	tables = numpy.arange(256, dtype=numpy.int64).reshape(1, -1) << (width - 8)
+	tables = numpy.repeat(tables, len(polys), axis=0)
+	for n in range(8):
+		tables = numpy.where(tables & top, ((tables << 1) & mask) ^ polys, (tables << 1) & mask)
+	return tables
+
+def crc_registers(data, tables, width):
+	# CRC registers with init=0 and no xorout, for each polynomial's table
+	# (rows) and each packet of data (columns). data is (packets, bytes).
+	mask = (1 << width) - 1
+	rows = numpy.arange(len(tables)).reshape(-1, 1)
+	registers = numpy.zeros((len(tables), len(data)), dtype=numpy.int64)
+	for column in numpy.asarray(data, dtype=numpy.int64).T:
+		index = (registers >> (width - 8)) ^ column.reshape(1, -1)
+		registers = ((registers << 8) & mask) ^ tables[rows, index]
+	return registers
+
+def crc_init_registers(inits, poly, width, bit_length):
+	# The register contribution of each init value, after bit_length bits.
+	mask = (1 << width) - 1
+	top = 1 << (width - 1)
+	registers = numpy.asarray(inits, dtype=numpy.int64)
+	for n in range(bit_length):
+		registers = numpy.where(registers & top, ((registers << 1) & mask) ^ poly, (registers << 1) & mask)
+	return registers
+
+def crc_values(data, poly, width, init=0, refin=False, refout=False, xorout=0, bit_length=None):
+	# Rocksoft model CRC of each row of data, over its last bit_length bits
+	# (default all of them; leading unused bits must be zero).
+	data = numpy.asarray(data, dtype=numpy.uint8)
+	if bit_length is None:
+		bit_length = data.shape[1] * 8
+	if refin:
+		data = reflected_bytes[data]
+	registers = crc_registers(data, crc_tables([poly], width), width)[0]
+	registers ^= crc_init_registers(init, poly, width, bit_length)
+	if refout:
+		registers = reflect_values(registers, width)
+	return registers ^ xorout
+
+def checksum_values(data, kind, width, offset=0):
+	# Sum, negated sum, or XOR of data bytes (width 8) or big-endian 16-bit
+	# words (width 16), plus or xor offset.
+	mask = (1 << width) - 1
+	units = numpy.asarray(data, dtype=numpy.int64)
+	if width == 16:
+		if units.shape[1] % 2:
+			units = numpy.pad(units, ((0, 0), (1, 0)), 'constant')
+		units = (units[:, 0::2] << 8) | units[:, 1::2]
+	if kind == 'sum':
+		return (offset + units.sum(axis=1)) & mask
+	if kind == 'negsum':
+		return (offset - units.sum(axis=1)) & mask
+	if kind == 'xor':
+		return offset ^ numpy.bitwise_xor.reduce(units, axis=1)
+	raise ValueError('unknown checksum kind %s' % kind)
+
+def field_bytes(bits, start, stop):
+	# Bits start:stop of each row, zero-extended at the front to whole bytes.
+	bits = bits[:, start:stop]
+	padding = (-bits.shape[1]) % 8
+	bits = numpy.pad(bits, ((0, 0), (padding, 0)), 'constant')
+	return numpy.packbits(bits, axis=1)
+
+def field_values(bits, start, width):
+	powers = 1 << numpy.arange(width - 1, -1, -1, dtype=numpy.int64)
+	return bits[:, start:start + width].astype(numpy.int64).dot(powers)
+
+def constant_columns(values):
+	# Rows of values that are the same in every column.
+	return (values == values[:, :1]).all(axis=1)
+
+def search_crc_task(task):
+	# Pool worker: returns (poly, refin, refout, constant) for each
+	# polynomial in the chunk that fits every packet.
+	width, polys, data, targets = task
+	tables = crc_tables(polys, width)
+	matches = []
+	for refin in (False, True):
+		registers = crc_registers(reflected_bytes[data] if refin else data, tables, width)
+		for refout in (False, True):
+			outputs = reflect_values(registers, width) if refout else registers
+			differences = outputs ^ targets.reshape(1, -1)
+			for n in numpy.flatnonzero(constant_columns(differences)):
+				matches.append((int(polys[n]), refin, refout, int(differences[n, 0])))
+	return matches
+
+def search_crc(data, targets, width, bit_length, jobs=1, chunk_size=4096, sample_size=32):
+	# Yields a result dict for every Rocksoft model CRC that fits. init is
+	# reported as 0, with the init that needs no xorout when there is one.
+	# Polynomials are screened on sample_size packets, then matches are
+	# checked against all of them.
+	polys = numpy.arange(1 << width, dtype=numpy.int64)
+	tasks = [(width, polys[n:n+chunk_size], data[:sample_size], targets[:sample_size]) for n in range(0, len(polys), chunk_size)]
+	pool = None
+	if jobs > 1:
+		pool = multiprocessing.Pool(jobs)
+		results = pool.imap(search_crc_task, tasks)
+	else:
+		results = map(search_crc_task, tasks)
+
+	inits = numpy.arange(1 << width, dtype=numpy.int64)
+	byte_aligned = (bit_length % 8) == 0
+	try:
+		for matches in results:
+			for poly, refin, refout, constant in matches:
+				# Reflected input is only defined over whole bytes.
+				if refin and not byte_aligned:
+					continue
+				outputs = crc_values(data, poly, width, refin=refin, refout=refout, bit_length=bit_length)
+				if not (outputs ^ targets == constant).all():
+					continue
+				init_registers = crc_init_registers(inits, poly, width, bit_length)
+				if refout:
+					init_registers = reflect_values(init_registers, width)
+				no_xorout = numpy.flatnonzero(init_registers == constant)
+				yield {
+					'width': width,
+					'poly': poly,
+					'refin': refin,
+					'refout': refout,
+					'xorout': constant,
+					'no_xorout_init': int(no_xorout[0]) if len(no_xorout) else None,
+				}
+	finally:
+		if pool is not None:
+			pool.close()
+			pool.join()
+
+def search_checksums(data, targets, width):
+	# The offset is whatever makes the first packet's checksum match.
+	mask = (1 << width) - 1
+	for kind in checksum_kinds:
+		values = checksum_values(data, kind, width)
+		if kind == 'xor':
+			differences = targets ^ values
+		else:
+			differences = (targets - values) & mask
+		if (differences == differences[0]).all():
+			yield {'kind': kind, 'width': width, 'offset': int(differences[0])}
+
+def format_crc(result):
+	digits = result['width'] // 4
+	s = 'crc%d poly=0x%0*x init=0x%0*x refin=%s refout=%s xorout=0x%0*x' % (
+		result['width'],
+		digits, result['poly'],
+		digits, 0,
+		result['refin'], result['refout'],
+		digits, result['xorout'],
+	)
+	if result['xorout'] != 0 and result['no_xorout_init'] is not None:
+		s += ' (or init=0x%0*x xorout=0x%0*x)' % (digits, result['no_xorout_init'], digits, 0)
+	return s
+
+def format_checksum(result):
+	return '%s%d offset=0x%0*x' % (result['kind'], result['width'], result['width'] // 4, result['offset'])
+
+if __name__ == '__main__':
+	parser = ArgumentParser()
+	parser.add_argument('input', nargs='?', default=None, help="Text packet file or binary packet log (default: stdin)")
+	parser.add_argument('-e', '--encoding', type=str, default='raw', choices=sorted(decoders), help="Bit encoding")
+	parser.add_argument('--width', type=int, default=8, choices=crc_widths, help="CRC or checksum width in bits")
+	parser.add_argument('--start', type=int, required=True, help="First bit covered by the CRC or checksum")
+	parser.add_argument('--end', type=int, required=True, help="Bit after the last bit covered by the CRC or checksum")
+	parser.add_argument('--offs-crc', type=int, required=True, help="Bit offset of the CRC or checksum field")
+	parser.add_argument('--min-count', type=int, default=1, help="Only use payloads that occur at least this many times")
+	parser.add_argument('-j', '--jobs', type=int, default=1, help="Number of worker processes")
+	args = parser.parse_args()
+
+	decoder_fn = decoders[args.encoding]
+
+	length = max(args.end, args.offs_crc + args.width)
+	payload_counts = {}
+	for packet in iterate_packets(args.input):
+		bits = truncate_invalid(decoder_fn(payload_bits(packet['payload'])))
+		if len(bits) < length:
+			continue
+		key = bits[:length].tobytes()
+		payload_counts[key] = payload_counts.get(key, 0) + 1
+
+	payloads = [key for key, count in payload_counts.items() if count >= args.min_count]
+	if len(payloads) < 2:
+		sys.stderr.write('At least two distinct payloads of %d or more bits are needed\n' % length)
+		sys.exit(1)
+
+	bits = numpy.frombuffer(b''.join(payloads), dtype=numpy.uint8).reshape(-1, length)
+	data = field_bytes(bits, args.start, args.end)
+	targets = field_values(bits, args.offs_crc, args.width)
+	print('Searching %d payloads' % len(payloads))
+
+	for result in search_checksums(data, targets, args.width):
+		print(format_checksum(result))
+	for result in search_crc(data, targets, args.width, args.end - args.start, args.jobs):
+		print(format_crc(result))
@@ -25,36 +25,29 @@ from gnuradio import blocks
 from gnuradio import eng_notation
 from gnuradio import filter
 from gnuradio import gr
-from gnuradio.eng_option import eng_option
 from gnuradio.filter import firdes
-from optparse import OptionParser
-import math
+from argparse import ArgumentParser
 import sys
+import os
 import os.path
-import datetime
-import pytz
-from iso8601 import iso8601
+import glob
+import time
+import multiprocessing
 
 from burst_detector import *
+from burst_index import parse_capture_filename, index_capture
+from burst_scan import add_detector_arguments, detector_settings
 
 class top_block(gr.top_block):
 
-    def __init__(self, source_path):
+    def __init__(self, source_path, output_path, batch=False, detector_args=None):
         gr.top_block.__init__(self, "Top Block")
 
-        source_directory, source_filename = os.path.split(source_path)
-        source_filename, source_extension = os.path.splitext(source_filename)
-        target_signal, carrier_freq, sampling_rate, start_date, start_time, capture_device = source_filename.split('_')
+        if detector_args is None:
+            detector_args = {}
 
-        if sampling_rate[-1].upper() == 'M':
-            sampling_rate = float(sampling_rate[:-1]) * 1e6
-        else:
-            raise RuntimeError('Unsupported sampling rate "%s"' % sampling_rate)
-
-        start_timestamp = iso8601.datetime.strptime(start_date + ' ' + start_time, '%Y%m%d %H%M%Sz')
-        utc = pytz.utc
-        start_timestamp = utc.localize(start_timestamp)
-        f_ts = open('timestamp.txt', 'w')
+        carrier_freq, sampling_rate, start_timestamp = parse_capture_filename(source_path)
+        f_ts = open(os.path.join(output_path, 'timestamp.txt'), 'w')
         f_ts.write(start_timestamp.isoformat())
         f_ts.close()
 
@@ -68,8 +61,8 @@ class top_block(gr.top_block):
         # Blocks
         ##################################################
         self.blocks_file_source_0 = blocks.file_source(gr.sizeof_gr_complex*1, source_path, False)
-        self.burst_detector = burst_detector()
-        self.blocks_tagged_file_sink_0 = blocks.tagged_file_sink(gr.sizeof_gr_complex*1, samp_rate)
+        self.burst_detector = burst_detector(batch=batch, **detector_args)
+        self.blocks_tagged_file_sink_0 = tagged_burst_sink(output_path, samp_rate)
 
         ##################################################
         # Connections
@@ -77,10 +70,94 @@ class top_block(gr.top_block):
         self.connect((self.blocks_file_source_0, 0), (self.burst_detector, 0))
         self.connect((self.burst_detector, 0), (self.blocks_tagged_file_sink_0, 0))
 
+def capture_paths(paths):
+    # Expand directories into the capture files they contain.
+    result = []
+    for path in paths:
+        if os.path.isdir(path):
+            result.extend(sorted(glob.glob(os.path.join(path, '*.cfile'))))
+        else:
+            result.append(path)
+    return result
+
+def capture_output_path(capture_path, output_root):
+    capture_directory, capture_filename = os.path.split(capture_path)
+    capture_basename, capture_extension = os.path.splitext(capture_filename)
+    return os.path.join(output_root, capture_basename)
+
+def extract_capture(task):
+    # Runs in a worker process: extract one capture, return its statistics.
+    capture_path, output_path, index, batch, chunk_jobs, detector_args = task
+    start_time = time.time()
+
+    if index:
+        burst_count = len(index_capture(capture_path, jobs=chunk_jobs, **detector_args))
+    else:
+        if not os.path.exists(output_path):
+            os.makedirs(output_path)
+        tb = top_block(capture_path, output_path, batch=batch, detector_args=detector_args)
+        tb.start()
+        tb.wait()
+        burst_count = tb.blocks_tagged_file_sink_0.burst_count
+
+    return capture_path, os.path.getsize(capture_path), burst_count, time.time() - start_time
+
 if __name__ == '__main__':
-    parser = OptionParser(option_class=eng_option, usage="%prog: [options]")
-    (options, args) = parser.parse_args()
-    tb = top_block(sys.argv[1])
-    tb.start()
-    tb.wait()
+    parser = ArgumentParser()
+    parser.add_argument('captures', type=str, nargs='+', help="Capture files (.cfile), or directories of them")
+    parser.add_argument('--batch', action='store_true', default=False, help="Detect bursts with one batched FFT per work call")
+    parser.add_argument('--index', action='store_true', default=False, help="Write a burst index next to the capture instead of a file per burst")
+    parser.add_argument('-j', '--jobs', type=int, default=multiprocessing.cpu_count(), help="Number of captures to extract in parallel")
+    parser.add_argument('-o', '--output', type=str, default=None, help="Directory in which to create a burst directory per capture")
+    add_detector_arguments(parser)
+    options = parser.parse_args()
+
+    detector_args = detector_settings(options)
+
+    captures = [os.path.abspath(path) for path in capture_paths(options.captures)]
+    if options.output is None and len(captures) == 1:
+        # Single capture: extract into the current directory, as always.
+        output_paths = [os.getcwd()]
+    else:
+        output_root = os.path.abspath(options.output or '.')
+        output_paths = [capture_output_path(path, output_root) for path in captures]
+
+    # With fewer captures than jobs, index one capture at a time and split
+    # each capture into chunks across the workers instead.
+    chunk_jobs = options.jobs if (options.index and len(captures) < options.jobs) else 1
+    tasks = [(capture_path, output_path, options.index, options.batch, chunk_jobs, detector_args) for capture_path, output_path in zip(captures, output_paths)]
+
+    start_time = time.time()
+    total_bytes = 0
+    total_bursts = 0
+
+    if chunk_jobs > 1:
+        pool = None
+        results = map(extract_capture, tasks)
+    else:
+        pool = multiprocessing.Pool(max(1, min(options.jobs, len(tasks))))
+        results = pool.imap_unordered(extract_capture, tasks)
+
+    for n, result in enumerate(results, 1):
+        capture_path, capture_bytes, burst_count, elapsed = result
+        total_bytes += capture_bytes
+        total_bursts += burst_count
+        print('[%d/%d] %s: %d bursts, %.1f MB/s' % (
+            n, len(tasks),
+            os.path.basename(capture_path),
+            burst_count,
+            capture_bytes / 1e6 / max(elapsed, 1e-6),
+        ))
+    if pool is not None:
+        pool.close()
+        pool.join()
 
+    elapsed = time.time() - start_time
+    print('%d captures, %d bursts, %.1f MB in %.1f s (%.1f MB/s, %.2f Msamples/s)' % (
+        len(tasks),
+        total_bursts,
+        total_bytes / 1e6,
+        elapsed,
+        total_bytes / 1e6 / max(elapsed, 1e-6),
+        total_bytes / float(8) / 1e6 / max(elapsed, 1e-6),
+    ))
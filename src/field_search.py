@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2013 Jared Boone
+#
+# This file is part of the TPMS project.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# Ranks candidate fields in a corpus of fixed-length packets: constant
+# ranges, device ID ranges, ranges that vary slowly over time for each
+# device (pressure, temperature, counters), and trailing CRCs or checksums.
+
+import sys
+from argparse import ArgumentParser
+
+import numpy
+
+from bit_coding import *
+from bit_matrix import BitMatrix
+from burst_index import timestamp_to_ns
+from packet_input import iterate_packets, payload_bits
+from crc_search import field_bytes, field_values, search_checksums, search_crc, format_checksum, format_crc
+
+def load_packets(source, encoding, length, chunk_size=65536):
+	# Returns a BitMatrix of the first length decoded bits of each packet
+	# that has that many, and their timestamps (ns, or input order).
+	decoder_fn = decoders[encoding]
+	raw_length = length if encoding == 'raw' else length * 2
+	chunks = []
+	timestamps = []
+	chunk = []
+	chunk_timestamps = []
+
+	def flush():
+		if chunk:
+			bits = decoder_fn(numpy.vstack(chunk))[:, :length]
+			valid = ~(bits == INVALID).any(axis=1)
+			chunks.append(bits[valid])
+			timestamps.append(numpy.array(chunk_timestamps, dtype=numpy.int64)[valid])
+		del chunk[:]
+		del chunk_timestamps[:]
+
+	for n, packet in enumerate(iterate_packets(source)):
+		bits = payload_bits(packet['payload'])
+		if len(bits) < raw_length:
+			continue
+		chunk.append(bits[:raw_length])
+		chunk_timestamps.append(timestamp_to_ns(packet['timestamp']) if packet.get('timestamp') else n)
+		if len(chunk) >= chunk_size:
+			flush()
+	flush()
+
+	bits = numpy.vstack(chunks) if chunks else numpy.zeros((0, length), dtype=numpy.uint8)
+	timestamps = numpy.concatenate(timestamps) if timestamps else numpy.zeros((0,), dtype=numpy.int64)
+	matrix = BitMatrix(bits, numpy.full((len(bits),), length, dtype=numpy.int64), numpy.ones((len(bits),), dtype=numpy.int64))
+	return matrix, timestamps
+
+def iterate_windows(bits, width):
+	# Yields (start, values) for every width-bit range, each computed from
+	# the one before it.
+	mask = (1 << width) - 1
+	values = field_values(bits, 0, width)
+	yield 0, values
+	for start in range(1, bits.shape[1] - width + 1):
+		values = ((values << 1) & mask) | bits[:, start + width - 1]
+		yield start, values
+
+def bit_runs(flags):
+	# (start, stop) of each run of True.
+	edges = numpy.diff(numpy.concatenate(([0], flags.astype(numpy.int8), [0])))
+	return list(zip(numpy.flatnonzero(edges == 1), numpy.flatnonzero(edges == -1)))
+
+def covering_values(values, coverage):
+	# The number of distinct values that together account for coverage of
+	# the rows.
+	counts = numpy.sort(numpy.unique(values, return_counts=True)[1])[::-1]
+	return int(numpy.searchsorted(numpy.cumsum(counts), coverage * len(values))) + 1
+
+def constant_ranges(matrix, tolerance):
+	# Runs of bits that have the same value in all but tolerance of rows.
+	ones, totals = matrix.bit_counts()
+	ratio = ones / numpy.maximum(totals, 1).astype(numpy.float64)
+	constant = (ratio <= tolerance) | (ratio >= 1.0 - tolerance)
+	majority = (ratio >= 0.5).astype(numpy.uint8)
+	return [(start, stop, majority[start:stop]) for start, stop in bit_runs(constant)], constant
+
+def device_id_range(matrix, constant, max_ids, coverage, seed_width=16, growth=1.5, sample_size=65536):
+	# The range most likely to be a device ID: it takes only a few values,
+	# one per transmitter. Starting from the seed_width range with the
+	# fewest values (and few constant bits), it grows a bit at a time while
+	# the number of values grows by less than growth, as it does with more
+	# ID bits but not with a bit of another field. Constant bits at either
+	# end are then trimmed. Returns (start, stop, values) or None.
+	bits = matrix.bits[numpy.random.RandomState(0).permutation(len(matrix))[:sample_size]]
+
+	def count(start, stop):
+		return covering_values(field_values(bits, start, stop - start), coverage)
+
+	seeds = []
+	for start, values in iterate_windows(bits, seed_width):
+		if constant[start:start + seed_width].sum() <= seed_width // 4:
+			seeds.append((covering_values(values, coverage), start))
+	seeds = [seed for seed in seeds if 1 < seed[0] <= max_ids]
+	if not seeds:
+		return None
+
+	values, start = min(seeds)
+	stop = start + seed_width
+	while stop - start < 62:
+		grown = []
+		if start > 0:
+			grown.append((count(start - 1, stop), start - 1, stop))
+		if stop < matrix.width:
+			grown.append((count(start, stop + 1), start, stop + 1))
+		if not grown or min(grown)[0] > values * growth:
+			break
+		values, start, stop = min(grown)
+
+	while constant[start]:
+		start += 1
+	while constant[stop - 1]:
+		stop -= 1
+	return start, stop, count(start, stop)
+
+def device_order(matrix, timestamps, device_range):
+	# Row order by device, then time, and whether each row is from the same
+	# device as the row before it.
+	if device_range is None:
+		devices = numpy.zeros((len(matrix),), dtype=numpy.int64)
+	else:
+		start, stop = device_range
+		devices = field_values(matrix.bits, start, stop - start)
+	order = numpy.lexsort((timestamps, devices))
+	devices = devices[order]
+	return order, devices[1:] == devices[:-1]
+
+def varying_ranges(matrix, order, same_device, excluded, max_smoothness, widths=(8, 16), limit=10):
+	# Ranges whose values change little from one packet to the next from
+	# the same device, compared to between random packets. Returns
+	# (start, stop, smoothness, counter) best first, not overlapping:
+	# smoothness is that ratio, counter the share of steps of +1.
+	shuffled = numpy.random.RandomState(0).permutation(len(matrix))
+	bits = matrix.bits[order]
+	candidates = []
+	for width in widths:
+		if width > matrix.width:
+			continue
+		mask = (1 << width) - 1
+		for start, values in iterate_windows(bits, width):
+			if excluded[start:start + width].any():
+				continue
+			steps = (values[1:] - values[:-1])[same_device]
+			if len(steps) == 0 or not steps.any():
+				continue
+			baseline = numpy.abs(values - values[shuffled]).mean()
+			smoothness = numpy.abs(steps).mean() / baseline
+			if smoothness > max_smoothness:
+				continue
+			counter = ((steps & mask) == 1).mean()
+			candidates.append((smoothness, start, start + width, counter))
+
+	chosen = []
+	used = numpy.zeros((matrix.width,), dtype=numpy.bool_)
+	for smoothness, start, stop, counter in sorted(candidates):
+		if used[start:stop].any():
+			continue
+		used[start:stop] = True
+		chosen.append((start, stop, smoothness, counter))
+		if len(chosen) >= limit:
+			break
+	return chosen
+
+def unique_rows(bits):
+	packed = numpy.ascontiguousarray(numpy.packbits(bits, axis=1))
+	rows = packed.view(numpy.dtype((numpy.void, packed.shape[1]))).ravel()
+	unique_packed = numpy.unique(rows).view(numpy.uint8).reshape(-1, packed.shape[1])
+	return numpy.unpackbits(unique_packed, axis=1)[:, :bits.shape[1]]
+
+def is_plain(result):
+	# No offset, or no init and xorout.
+	if 'offset' in result:
+		return result['offset'] == 0
+	return result['xorout'] == 0
+
+def checksum_ranges(matrix, constant, widths=(8,), max_start=16, sample_size=4096):
+	# CRCs and checksums in a field at one of the last eight bit offsets a
+	# field fits at, over data from one of the first max_start bits up to
+	# the field (whole bytes of it for 16-bit fields, to keep the search
+	# short). A field can have no constant bits. Including or leaving
+	# out constant leading bits only changes init, so for each CRC or
+	# checksum kind, the plain fit (see is_plain) with the most data is
+	# yielded, as (start, offset, width, result).
+	unique_bits = unique_rows(matrix.bits)[:sample_size]
+	for width in widths:
+		last_offset = matrix.width - width
+		for offset in range(max(0, last_offset - 7), last_offset + 1):
+			if constant[offset:offset + width].any():
+				continue
+			targets = field_values(unique_bits, offset, width)
+			best = {}
+			for start in range(0, min(max_start, offset - width) + 1):
+				if width > 8 and (offset - start) % 8:
+					continue
+				data = field_bytes(unique_bits, start, offset)
+				results = list(search_checksums(data, targets, width))
+				results += list(search_crc(data, targets, width, offset - start))
+				for result in results:
+					kind = result.get('kind', result.get('poly'))
+					if kind not in best or (is_plain(result) and not is_plain(best[kind][1])):
+						best[kind] = (start, result)
+			for kind in best:
+				start, result = best[kind]
+				yield start, offset, width, result
+
+if __name__ == '__main__':
+	parser = ArgumentParser()
+	parser.add_argument('input', nargs='?', default=None, help="Text packet file or binary packet log (default: stdin)")
+	parser.add_argument('-l', '--length', type=int, required=True, help="Packet decoded symbol length (longer packets will be truncated, shorter ones skipped)")
+	parser.add_argument('-e', '--encoding', type=str, default='raw', choices=sorted(decoders), help="Bit encoding")
+	parser.add_argument('--tolerance', type=float, default=0.01, help="Share of packets that may differ in a constant bit")
+	parser.add_argument('--max-ids', type=int, default=64, help="Most device IDs expected in the corpus")
+	parser.add_argument('--coverage', type=float, default=0.99, help="Share of packets the device IDs must account for")
+	parser.add_argument('--smoothness', type=float, default=0.5, help="Largest ratio of a varying range's change between packets from one device to its change between random packets")
+	parser.add_argument('--crc16', action="store_true", help="Also search for 16-bit trailing CRCs and checksums (slower)")
+	args = parser.parse_args()
+
+	matrix, timestamps = load_packets(args.input, args.encoding, args.length)
+	if len(matrix) == 0:
+		sys.stderr.write('No packets of %d or more bits\n' % args.length)
+		sys.exit(1)
+	print('%d packets' % len(matrix))
+	print
+
+	constants, constant = constant_ranges(matrix, args.tolerance)
+	print('Constant ranges:')
+	for start, stop, bits in constants:
+		print('\t%3d:%-3d %s' % (start, stop, bits_to_string(bits)))
+	print
+
+	ids = device_id_range(matrix, constant, args.max_ids, args.coverage)
+	print('Device ID range:')
+	if ids is not None:
+		print('\t%3d:%-3d %d values' % ids)
+	print
+
+	# Checksums are found first, so they are not mistaken for varying
+	# fields.
+	checksums = list(checksum_ranges(matrix, constant, (8, 16) if args.crc16 else (8,)))
+
+	device_range = ids[:2] if ids is not None else None
+	excluded = constant.copy()
+	if device_range is not None:
+		excluded[device_range[0]:device_range[1]] = True
+	for start, offset, width, result in checksums:
+		excluded[offset:offset + width] = True
+	order, same_device = device_order(matrix, timestamps, device_range)
+	if device_range is not None:
+		print('Slowly varying ranges, per device ID %d:%d:' % device_range)
+	else:
+		print('Slowly varying ranges:')
+	for start, stop, smoothness, counter in varying_ranges(matrix, order, same_device, excluded, args.smoothness):
+		print('\t%3d:%-3d smoothness %.3f%s' % (start, stop, smoothness, ' counter %.0f%%' % (counter * 100) if counter >= 0.5 else ''))
+	print
+
+	print('Trailing CRC and checksum ranges:')
+	for start, offset, width, result in checksums:
+		description = format_checksum(result) if 'kind' in result else format_crc(result)
+		print('\t%3d:%-3d over %d:%d %s' % (offset, offset + width, start, offset, description))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2013 Jared Boone
+#
+# This file is part of the TPMS project.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+# ASK (on-off keying) demodulation in NumPy.
+#
+# Mirrors the ASKDemodulator flowgraph in tpms_fsk.py block for block:
+# carrier correlator FIR filter, magnitude, DC blocker, Mueller & Muller
+# clock recovery and binary slicer, then an access code search. Unlike the
+# standalone tpms_ask.py, there is no fixed sampling rate or resampler;
+# clock recovery runs at whatever samples-per-symbol the burst has.
+
+import math
+
+import numpy
+import scipy.signal
+
+from numpy_fsk import fsk_padding, fir_filter_ccc, complex_to_mag, clock_recovery_mm, binary_slicer, burst_bits, access_code_packets, demodulate_bursts
+
+def ask_taps(sampling_rate, carrier_hz, symbol_rate):
+	# One symbol's worth of the carrier, for integrating the envelope.
+	samples_per_symbol = float(sampling_rate) / symbol_rate
+	tap_count = int(math.floor(samples_per_symbol))
+	return numpy.exp(numpy.arange(tap_count, dtype=numpy.float32) * 2.0j * numpy.pi * carrier_hz / sampling_rate)
+
+def ask_dc_length(sampling_rate, symbol_rate):
+	# DC blocker moving average length, 16 symbols (as tpms_ask.py's 64
+	# samples at 4 samples per symbol).
+	return max(2, int(round(float(sampling_rate) / symbol_rate * 16)))
+
+def ask_padding(sampling_rate, symbol_rate):
+	# Zeros appended to a burst to flush the filter, DC blocker and clock
+	# recovery.
+	samples_per_symbol = float(sampling_rate) / symbol_rate
+	return fsk_padding(sampling_rate, symbol_rate) + 2 * ask_dc_length(sampling_rate, symbol_rate) + int(math.floor(samples_per_symbol))
+
+def moving_average(data, length):
+	return scipy.signal.lfilter(numpy.ones((length,), dtype=numpy.float32) / numpy.float32(length), numpy.float32(1), numpy.asarray(data, dtype=numpy.float32))
+
+def dc_blocker(data, length):
+	# Equivalent of filter.dc_blocker_ff(length, True): the input, delayed
+	# by 2 * (length - 1) to match the group delay of four cascaded moving
+	# averages, minus the output of those moving averages.
+	averaged = data
+	for n in range(4):
+		averaged = moving_average(averaged, length)
+	delay = 2 * (length - 1)
+	delayed = numpy.zeros((len(data),), dtype=numpy.float32)
+	delayed[delay:] = data[:max(0, len(data) - delay)]
+	return (delayed - averaged).astype(numpy.float32)
+
+class NumpyASKDemodulator(object):
+	# Same interface as tpms_fsk.ASKDemodulator: built once per set of
+	# parameters, then fed bursts through demodulate().
+	def __init__(self, sampling_rate, carrier_hz, symbol_rate, access_code, callback=None, access_code_threshold=0):
+		self._access_code = access_code
+		self._access_code_threshold = access_code_threshold
+		self._callback = callback
+
+		self.samples_per_symbol = float(sampling_rate) / symbol_rate
+
+		self.omega = self.samples_per_symbol * 1.0
+		self.mu = 0.5
+		self.gain_mu = 0.03
+		self.gain_omega = 0.25 * self.gain_mu * self.gain_mu
+		self.omega_relative_limit = 0.0002
+
+		self.taps = ask_taps(sampling_rate, carrier_hz, symbol_rate)
+		self.dc_length = ask_dc_length(sampling_rate, symbol_rate)
+		self.padding = ask_padding(sampling_rate, symbol_rate)
+
+	def demodulate_burst(self, source_data):
+		source_data = numpy.concatenate((source_data, numpy.zeros((self.padding,), dtype=numpy.complex64)))
+
+		mag = complex_to_mag(fir_filter_ccc(self.taps, source_data))
+		envelope = dc_blocker(mag, self.dc_length)
+
+		symbols = clock_recovery_mm(envelope, self.omega, self.gain_omega, self.mu, self.gain_mu, self.omega_relative_limit)
+		bits = burst_bits(binary_slicer(symbols))
+		return access_code_packets(bits, self._access_code, self._access_code_threshold)
+
+	def demodulate(self, bursts):
+		return demodulate_bursts(self.demodulate_burst, bursts, self._callback)
@@ -25,34 +25,122 @@ from gnuradio import gr
 
 import numpy
 
+class GrowableArray(object):
+	# Append-only array with amortized O(1) growth. The backing buffer grows
+	# geometrically, and data is a view of the filled region (no copy).
+	def __init__(self, dtype, capacity=4096, growth=2.0):
+		self._buffer = numpy.empty((max(int(capacity), 1),), dtype=dtype)
+		self._length = 0
+		self._growth = max(float(growth), 1.1)
+
+	def __len__(self):
+		return self._length
+
+	@property
+	def capacity(self):
+		return len(self._buffer)
+
+	@property
+	def data(self):
+		return self._buffer[:self._length]
+
+	def reserve(self, capacity):
+		if capacity > len(self._buffer):
+			buffer = numpy.empty((int(capacity),), dtype=self._buffer.dtype)
+			buffer[:self._length] = self._buffer[:self._length]
+			self._buffer = buffer
+
+	def append(self, values):
+		required = self._length + len(values)
+		if required > len(self._buffer):
+			capacity = len(self._buffer)
+			while capacity < required:
+				capacity = int(capacity * self._growth) + 1
+			self.reserve(capacity)
+		self._buffer[self._length:required] = values
+		self._length = required
+
+	def clear(self):
+		self._length = 0
+
 class NumpySource(gr.sync_block):
-	def __init__(self, data):
-		super(NumpySource, self).__init__("NumpySource", None, [data.dtype])
-		self._data = data
+	# Streams an array (possibly memory-mapped) through an offset cursor,
+	# followed by "padding" zeros that are never allocated. Given a list of
+	# arrays, emits them back-to-back, each followed by its padding, and
+	# tags the first item of each with ('burst', <burst number>).
+	# A source built with dtype and an empty list can be loaded with data
+	# later through reset(), so one flowgraph can be run over many bursts.
+	def __init__(self, data, padding=0, dtype=None):
+		if dtype is None:
+			dtype = data[0].dtype if isinstance(data, (list, tuple)) else data.dtype
+		super(NumpySource, self).__init__("NumpySource", None, [dtype])
+
+		self._padding = padding
+		self._burst_tag_symbol = gr.pmt.string_to_symbol('burst')
+
+		self.reset(data)
+
+	def reset(self, data):
+		self._tagged = isinstance(data, (list, tuple))
+		self._bursts = list(data) if self._tagged else [data]
+
+		# Cursor: current burst, and offset within burst plus its padding.
+		self._burst_n = 0
+		self._offset = 0
+
+	@property
+	def length(self):
+		# Total items emitted, including padding.
+		return sum(len(burst) for burst in self._bursts) + self._padding * len(self._bursts)
+
+	@property
+	def offsets(self):
+		# Start of each burst within the output stream.
+		lengths = [len(burst) + self._padding for burst in self._bursts]
+		return numpy.concatenate(([0], numpy.cumsum(lengths)[:-1])).astype(numpy.int64)
 
 	def work(self, input_items, output_items):
-		if len(self._data) == 0:
-			return -1
+		output_item = output_items[0]
+		noutput_items = 0
+		while noutput_items < len(output_item) and self._burst_n < len(self._bursts):
+			burst = self._bursts[self._burst_n]
+			if self._offset == 0 and self._tagged:
+				self.add_item_tag(0, self.nitems_written(0) + noutput_items, self._burst_tag_symbol, gr.pmt.from_long(self._burst_n))
+
+			remaining = len(burst) + self._padding - self._offset
+			n = min(len(output_item) - noutput_items, remaining)
+			data_n = max(0, min(n, len(burst) - self._offset))
+			output_item[noutput_items:noutput_items + data_n] = burst[self._offset:self._offset + data_n]
+			output_item[noutput_items + data_n:noutput_items + n] = 0
+			noutput_items += n
+
+			self._offset += n
+			if self._offset == len(burst) + self._padding:
+				self._burst_n += 1
+				self._offset = 0
 
-		noutput_items = min(len(output_items[0]), len(self._data))
+		if noutput_items == 0:
+			return -1
 		#print('source %s' % noutput_items)
-		output_items[0][:noutput_items] = self._data[:noutput_items]
-		self._data = self._data[noutput_items:]
 		return noutput_items
 
 class NumpySink(gr.sync_block):
-	def __init__(self, dtype=None):
+	def __init__(self, dtype=None, capacity=4096):
 		super(NumpySink, self).__init__("NumpySink", [dtype], None)
 
-		self._data = numpy.empty((0,), dtype=dtype)
+		self._data = GrowableArray(dtype, capacity)
+
+	def reset(self, capacity=0):
+		self._data.clear()
+		self._data.reserve(capacity)
 
 	def work(self, input_items, output_items):
 		noutput_items = len(input_items[0])
 		if noutput_items > 0:
 			#print('sink %s' % noutput_items)
-			self._data = numpy.concatenate((self._data, input_items[0]))
+			self._data.append(input_items[0])
 		return noutput_items
 
 	@property
 	def data(self):
-		return self._data
+		return self._data.data
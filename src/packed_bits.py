@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2013 Jared Boone
+#
+# This file is part of the TPMS project.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+import numpy
+
+from bit_coding import string_to_bits, bits_to_string
+
+class PackedBits(object):
+	# Immutable bit string stored eight bits per byte (numpy.packbits, most
+	# significant bit first). Slicing is by bit and returns PackedBits;
+	# str() gives the '0'/'1' text form used in packet files.
+	def __init__(self, packed, length):
+		self._packed = numpy.asarray(packed, dtype=numpy.uint8)
+		self._length = int(length)
+
+	@classmethod
+	def from_bits(cls, bits):
+		bits = numpy.asarray(bits, dtype=numpy.uint8) & 1
+		return cls(numpy.packbits(bits), len(bits))
+
+	@classmethod
+	def from_string(cls, s):
+		return cls.from_bits(string_to_bits(s))
+
+	@property
+	def packed(self):
+		return self._packed
+
+	@property
+	def bits(self):
+		return numpy.unpackbits(self._packed)[:self._length]
+
+	def __len__(self):
+		return self._length
+
+	def __str__(self):
+		return bits_to_string(self.bits)
+
+	def __repr__(self):
+		return 'PackedBits(%r)' % str(self)
+
+	def __getitem__(self, key):
+		if isinstance(key, slice):
+			start, stop, step = key.indices(self._length)
+			if step == 1 and start % 8 == 0:
+				# Byte-aligned: no need to unpack.
+				length = max(0, stop - start)
+				packed = self._packed[start // 8:(start + length + 7) // 8].copy()
+				if length % 8:
+					packed[-1] &= (0xff << (8 - length % 8)) & 0xff
+				return PackedBits(packed, length)
+			return PackedBits.from_bits(self.bits[key])
+		if key < 0:
+			key += self._length
+		if key < 0 or key >= self._length:
+			raise IndexError('bit index out of range')
+		return int(self._packed[key // 8] >> (7 - key % 8)) & 1
+
+	def __eq__(self, other):
+		if not isinstance(other, PackedBits):
+			return NotImplemented
+		return self._length == other._length and numpy.array_equal(self._packed, other._packed)
+
+	def __ne__(self, other):
+		result = self.__eq__(other)
+		if result is NotImplemented:
+			return result
+		return not result
+
+	def __lt__(self, other):
+		# Same order as the '0'/'1' strings.
+		return str(self) < str(other)
+
+	def __hash__(self):
+		return hash((self._length, self._packed.tobytes()))
+
+	def tobytes(self):
+		return self._packed.tobytes()
+
+	def value(self, start=0, stop=None):
+		# Unsigned integer value of bits start:stop, first bit most
+		# significant.
+		bits = self[start:stop]
+		value = 0
+		for byte in bits._packed.tolist():
+			value = (value << 8) | byte
+		padding = len(bits._packed) * 8 - len(bits)
+		return value >> padding
+
+	def split_bytes(self, start_offset=0):
+		# Byte values of each 8 bits from start_offset on, as uint8. A short
+		# final chunk is taken as a number (right-aligned), like int(s, 2) of
+		# the text form.
+		bits = self.bits[start_offset:]
+		full_length = (len(bits) // 8) * 8
+		result = numpy.packbits(bits[:full_length])
+		remainder = len(bits) - full_length
+		if remainder:
+			last = numpy.packbits(bits[full_length:]) >> (8 - remainder)
+			result = numpy.concatenate((result, last.astype(numpy.uint8)))
+		return result
@@ -26,6 +26,9 @@ from gnuradio import gr
 import math
 import numpy
 
+from numpy_block import GrowableArray
+from spectrum import burst_spectrum
+
 def packet_format(l):
 	if 'X' in l:
 		return None
@@ -38,27 +41,26 @@ def packet_print(l):
 		print(formatted)
 
 class Packetizer(gr.sync_block):
-	def __init__(self):
+	def __init__(self, capacity=4096):
 		super(Packetizer, self).__init__(
 			"Packetizer",
 			[numpy.uint8],
 			None
 		)
-		self._data = None
+		self._data = GrowableArray(numpy.uint8, capacity)
 
 	@property
 	def data(self):
-		return self._data
+		return self._data.data
+
+	def reset(self, capacity=0):
+		self._data.clear()
+		self._data.reserve(capacity)
 
 	def work(self, input_items, output_items):
-		nitems = len(input_items[0])
-		
-		if self._data is None:
-			self._data = input_items[0].copy()
-		else:
-			self._data = numpy.concatenate((self._data, input_items[0]))
-			
-		return len(input_items[0])
+		noutput_items = len(input_items[0])
+		self._data.append(input_items[0])
+		return noutput_items
 
 
 
@@ -101,8 +103,9 @@ def packet_classify(data, sampling_rate):
 	# k1 = scipy.stats.kurtosis(envelope, fisher=False, bias=False)
 	# print(k1)
 
-	windowed_samples = data * scipy.signal.hanning(len(data))
-	spectrum = numpy.fft.fftshift(numpy.fft.fft(windowed_samples))
+	# Padding to at least 1024 points keeps short bursts from sharing too
+	# few bins between the three peaks.
+	spectrum = burst_spectrum(data, minimum_size=1024)
 	spectrum_mag = numpy.absolute(spectrum)
 	# spectrum_mag_sum = sum(spectrum_mag)
 	# spectrum_mag_avg = spectrum_mag_sum / len(spectrum_mag)
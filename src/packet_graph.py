@@ -24,11 +24,12 @@
 import sys
 from argparse import ArgumentParser
 
-from iso8601 import iso8601
+from packet_input import iterate_packets, payload_packed
 
 from matplotlib import pyplot
 
 parser = ArgumentParser()
+parser.add_argument('input', nargs='?', default=None, help="Text packet file or binary packet log (default: stdin)")
 parser.add_argument('--range', type=str, help="Range of bits to graph")
 args = parser.parse_args()
 
@@ -36,14 +37,8 @@ args.range = tuple(map(int, args.range.split(',')))
 
 decoded_packets = []
 
-packet_fields = ('timestamp', 'access_code', 'payload', 'modulation', 'carrier', 'deviation', 'symbol_rate', 'filename')
-
-for packet_line in sys.stdin:
-	packet = dict(zip(packet_fields, packet_line.split()))
-	packet['timestamp'] = iso8601.parse_date(packet['timestamp'])
-	packet['carrier'] = float(packet['carrier'])
-	packet['deviation'] = float(packet['deviation'])
-	packet['symbol_rate'] = float(packet['symbol_rate'])
+for packet in iterate_packets(args.input):
+	packet['payload'] = payload_packed(packet['payload'])
 
 	decoded_packets.append(packet)
 
@@ -54,6 +49,6 @@ x = []
 y = []
 for packet in sorted(decoded_packets, key=lambda a: a['timestamp']):
 	x.append(packet['timestamp'])
-	y.append(int(packet['payload'][args.range[0]:args.range[1]], 2))
+	y.append(packet['payload'].value(args.range[0], args.range[1]))
 pyplot.plot(x, y)
 pyplot.show()
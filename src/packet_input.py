@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2013 Jared Boone
+#
+# This file is part of the TPMS project.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# Shared packet file ingestion.
+#
+# Lines are read in chunks, and each chunk's timestamp column is parsed in
+# one numpy.datetime64 conversion. This works for the fixed isoformat()
+# layout that tpms_fsk.py writes (UTC, "+00:00" or "Z"). Other lines fall
+# back to iso8601.parse_date. Binary packet logs (see packet_log.py) are
+# read directly.
+
+import sys
+import itertools
+
+import numpy
+import pytz
+from iso8601 import iso8601
+
+from burst_index import timestamp_to_ns
+from packed_bits import PackedBits
+from bit_coding import string_to_bits
+from packet_log import PacketLog, is_packet_log, packet_fields
+
+utc_suffixes = ('+00:00', 'Z')
+
+def parse_timestamps(values):
+	# Returns nanoseconds since the Unix epoch for each timestamp string.
+	result = numpy.empty((len(values),), dtype=numpy.int64)
+	regular_n = []
+	regular = []
+	irregular_n = []
+	for n, value in enumerate(values):
+		for suffix in utc_suffixes:
+			if value.endswith(suffix):
+				regular_n.append(n)
+				regular.append(value[:-len(suffix)])
+				break
+		else:
+			irregular_n.append(n)
+
+	if regular:
+		try:
+			parsed = numpy.array(regular, dtype='datetime64[us]')
+			result[regular_n] = parsed.astype(numpy.int64) * 1000
+		except ValueError:
+			irregular_n = sorted(irregular_n + regular_n)
+
+	for n in irregular_n:
+		result[n] = timestamp_to_ns(iso8601.parse_date(values[n]))
+	return result
+
+def ns_to_datetimes(ns):
+	# Bulk inverse of parse_timestamps, as timezone-aware UTC datetimes.
+	naive = (numpy.asarray(ns, dtype=numpy.int64) // 1000).astype('datetime64[us]').astype(object)
+	return [timestamp.replace(tzinfo=pytz.utc) for timestamp in naive]
+
+def open_input(source):
+	if source is None or source == '-':
+		return sys.stdin
+	if hasattr(source, 'read'):
+		return source
+	return open(source)
+
+def iterate_records(source, chunk_size=65536):
+	# Yields (timestamp, fields) for each non-empty line, fields being the
+	# whitespace-split line. timestamp is None for one-field lines.
+	stream = open_input(source)
+	while True:
+		chunk = [line.split() for line in itertools.islice(stream, chunk_size)]
+		if not chunk:
+			break
+		chunk = [fields for fields in chunk if fields]
+		# TODO: Hack to skip the VOLK message that GNU Radio insists on writing to stdout.
+		chunk = [fields for fields in chunk if fields[:2] != ['Using', 'Volk']]
+		timestamped = [fields for fields in chunk if len(fields) > 1]
+		timestamps = iter(ns_to_datetimes(parse_timestamps([fields[0] for fields in timestamped])))
+		for fields in chunk:
+			if len(fields) > 1:
+				yield next(timestamps), fields
+			else:
+				yield None, fields
+
+def iterate_packets(source, chunk_size=65536):
+	# Yields packet dicts with packet_log.packet_fields, from a text packet
+	# file or stream, or from a binary packet log. Lines with only a payload
+	# give a dict with only 'payload'.
+	if isinstance(source, str) and is_packet_log(source):
+		for packet in PacketLog.load(source, mmap=True):
+			yield packet
+		return
+
+	for timestamp, fields in iterate_records(source, chunk_size):
+		if timestamp is None:
+			yield {'payload': fields[0]}
+			continue
+		packet = dict(zip(packet_fields, fields))
+		packet['timestamp'] = timestamp
+		packet['carrier'] = float(packet['carrier'])
+		packet['deviation'] = float(packet['deviation'])
+		packet['symbol_rate'] = float(packet['symbol_rate'])
+		yield packet
+
+def payload_bits(payload):
+	# uint8 bits of a payload read from either format.
+	if isinstance(payload, PackedBits):
+		return payload.bits
+	return string_to_bits(payload)
+
+def payload_packed(payload):
+	if isinstance(payload, PackedBits):
+		return payload
+	return PackedBits.from_string(payload)
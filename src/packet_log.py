@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2013 Jared Boone
+#
+# This file is part of the TPMS project.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# Binary packet log.
+#
+# An alternative to the whitespace-separated text lines written by
+# tpms_fsk.py. Each packet is a fixed-size record, so a log loads with
+# numpy.fromfile() (or memory-maps) as a structured array:
+#
+#   <name>          records, packet_log_dtype
+#   <name>.strings  filenames, access codes and modulations, one per
+#                   line; records refer to them by line number
+
+import sys
+import os.path
+from argparse import ArgumentParser
+
+import numpy
+from iso8601 import iso8601
+
+from burst_index import timestamp_to_ns, ns_to_timestamp
+from packed_bits import PackedBits
+
+# Longest payload a record holds. Longer payloads are refused, not
+# truncated, so converting text to a log and back is lossless.
+payload_bytes_max = 64
+
+packet_log_dtype = numpy.dtype([
+	('timestamp', numpy.int64),		# Nanoseconds since the Unix epoch, UTC.
+	('carrier', numpy.float32),
+	('deviation', numpy.float32),
+	('symbol_rate', numpy.float32),
+	('filename', numpy.uint32),		# Line number in the strings file.
+	('access_code', numpy.uint32),	# Line number in the strings file.
+	('modulation', numpy.uint32),	# Line number in the strings file.
+	('payload_length', numpy.uint16),	# In bits.
+	('payload', numpy.uint8, (payload_bytes_max,)),	# numpy.packbits() order.
+])
+
+packet_fields = ('timestamp', 'access_code', 'payload', 'modulation', 'carrier', 'deviation', 'symbol_rate', 'filename')
+
+def strings_path(log_path):
+	return log_path + '.strings'
+
+def is_packet_log(path):
+	return os.path.isfile(path) and os.path.isfile(strings_path(path))
+
+def read_strings(log_path):
+	path = strings_path(log_path)
+	if not os.path.exists(path):
+		return []
+	with open(path) as f:
+		return [line.rstrip('\n') for line in f]
+
+class PacketLog(object):
+	def __init__(self, records, strings):
+		self.records = records
+		self.strings = strings
+
+	@classmethod
+	def load(cls, path, mmap=False):
+		if mmap:
+			records = numpy.memmap(path, dtype=packet_log_dtype, mode='r')
+		else:
+			records = numpy.fromfile(path, dtype=packet_log_dtype)
+		return cls(records, read_strings(path))
+
+	def __len__(self):
+		return len(self.records)
+
+	def payload(self, n):
+		record = self.records[n]
+		length = int(record['payload_length'])
+		return PackedBits(record['payload'][:(length + 7) // 8], length)
+
+	def packet(self, n):
+		# Same fields, and types, as a parsed text line.
+		record = self.records[n]
+		return {
+			'timestamp': ns_to_timestamp(record['timestamp']),
+			'access_code': self.strings[record['access_code']],
+			'payload': self.payload(n),
+			'modulation': self.strings[record['modulation']],
+			'carrier': float(record['carrier']),
+			'deviation': float(record['deviation']),
+			'symbol_rate': float(record['symbol_rate']),
+			'filename': self.strings[record['filename']],
+		}
+
+	def __iter__(self):
+		for n in range(len(self.records)):
+			yield self.packet(n)
+
+class PacketLogWriter(object):
+	# Appends packets to a log, buffering count records per write.
+	def __init__(self, path, count=4096):
+		self._path = path
+		self._strings = read_strings(path)
+		self._string_ids = dict((s, n) for n, s in enumerate(self._strings))
+		self._file = open(path, 'ab')
+		self._strings_file = open(strings_path(path), 'a')
+		self._buffer = numpy.zeros((count,), dtype=packet_log_dtype)
+		self._buffer_count = 0
+
+	def _string_id(self, s):
+		if s not in self._string_ids:
+			self._string_ids[s] = len(self._strings)
+			self._strings.append(s)
+			self._strings_file.write(s + '\n')
+		return self._string_ids[s]
+
+	def write(self, timestamp, access_code, payload, modulation, carrier, deviation, symbol_rate, filename):
+		# Arguments are the text line's fields. payload is PackedBits or a
+		# '0'/'1' string.
+		if not isinstance(payload, PackedBits):
+			payload = PackedBits.from_string(payload)
+		if len(payload) > payload_bytes_max * 8:
+			raise ValueError('payload of %d bits is longer than the packet log limit of %d bits' % (len(payload), payload_bytes_max * 8))
+
+		record = self._buffer[self._buffer_count]
+		record['timestamp'] = timestamp_to_ns(timestamp)
+		record['carrier'] = carrier
+		record['deviation'] = deviation
+		record['symbol_rate'] = symbol_rate
+		record['filename'] = self._string_id(filename)
+		record['access_code'] = self._string_id(str(access_code))
+		record['modulation'] = self._string_id(modulation)
+		record['payload_length'] = len(payload)
+		record['payload'][:] = 0
+		record['payload'][:len(payload.packed)] = payload.packed
+
+		self._buffer_count += 1
+		if self._buffer_count == len(self._buffer):
+			self.flush()
+
+	def flush(self):
+		self._buffer[:self._buffer_count].tofile(self._file)
+		self._buffer_count = 0
+		self._file.flush()
+		self._strings_file.flush()
+
+	def close(self):
+		self.flush()
+		self._file.close()
+		self._strings_file.close()
+
+def parse_packet_line(line):
+	packet = dict(zip(packet_fields, line.split()))
+	packet['timestamp'] = iso8601.parse_date(packet['timestamp'])
+	packet['carrier'] = float(packet['carrier'])
+	packet['deviation'] = float(packet['deviation'])
+	packet['symbol_rate'] = float(packet['symbol_rate'])
+	return packet
+
+def format_packet_line(packet):
+	return '%s %s %s %s %d %d %d %s' % (
+		packet['timestamp'].isoformat(),
+		packet['access_code'],
+		packet['payload'],
+		packet['modulation'],
+		packet['carrier'],
+		packet['deviation'],
+		packet['symbol_rate'],
+		packet['filename'],
+	)
+
+def text_to_log(lines, log_path):
+	# Packets before one that can't be written are kept.
+	writer = PacketLogWriter(log_path)
+	count = 0
+	try:
+		for line in lines:
+			line = line.strip()
+			if len(line.split()) != len(packet_fields):
+				continue
+			packet = parse_packet_line(line)
+			writer.write(*[packet[field] for field in packet_fields])
+			count += 1
+	finally:
+		writer.close()
+	return count
+
+def log_to_text(log_path):
+	for packet in PacketLog.load(log_path, mmap=True):
+		yield format_packet_line(packet)
+
+if __name__ == '__main__':
+	parser = ArgumentParser()
+	parser.add_argument('log', type=str, help="Binary packet log")
+	parser.add_argument('--from-text', action="store_true", help="Append text packet lines from stdin to the log")
+	args = parser.parse_args()
+
+	if args.from_text:
+		try:
+			count = text_to_log(sys.stdin, args.log)
+		except ValueError as e:
+			sys.stderr.write('%s: %s\n' % (args.log, e))
+			sys.exit(1)
+		sys.stderr.write('%s: %d packets\n' % (args.log, count))
+	else:
+		for line in log_to_text(args.log):
+			print(line)
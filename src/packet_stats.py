@@ -22,78 +22,99 @@
 #
 
 import sys
-import math
 from collections import defaultdict
 from argparse import ArgumentParser
 
-import pytz
-from iso8601 import iso8601
-
 from bit_coding import *
+from packed_bits import PackedBits
+from packet_input import iterate_packets, payload_bits
+from stream_counters import SpaceSavingCounter, BloomFilter
+from bit_matrix import BitMatrix, format_range_key, add_padded
 
-def split_string_bytes(data, start_offset):
-	yield data[:start_offset]
-	for n in range(start_offset, len(data), 8):
-		yield data[n:n+8]
+import numpy
 
 parser = ArgumentParser()
+parser.add_argument('input', nargs='?', default=None, help="Text packet file or binary packet log (default: stdin)")
 parser.add_argument('-l', '--length', type=int, default=None, help="Required packet decoded symbol length (longer packets will be truncated)")
-parser.add_argument('-e', '--encoding', type=str, default='raw', help="Bit encoding (man, diffman)")
+parser.add_argument('-e', '--encoding', type=str, default='raw', choices=sorted(decoders), help="Bit encoding")
 parser.add_argument('--decoded', action="store_true", help="Display decoded packets")
 parser.add_argument('--ruler', action="store_true", help="Display bit-index ruler along with decoded packets")
 parser.add_argument('--lengthstats', action="store_true", help="Display statistics on packet length distribution")
 parser.add_argument('--bitstats', action="store_true", help="Display statistics on each bit across all packets")
 parser.add_argument('--brutecrc', type=int, default=None, help="Display packet data for brute force CRC, with packet occurrence above threshold")
 parser.add_argument('--rangestats', type=str, default=None, help="Display statistics on a range of bits")
+parser.add_argument('--bytestats', type=int, default=None, help="Display statistics on every byte-aligned 8-bit range, starting at this bit offset")
+parser.add_argument('--approximate', type=int, default=None, help="Constant memory: track at most this many payloads for --brutecrc, and detect repeated payloads for --bitstats with a Bloom filter")
 parser.add_argument('-v', '--verbose', action="store_true", default=False, help="Show more detail (if available)")
 args = parser.parse_args()
 
 if args.rangestats:
 	args.rangestats = tuple(map(int, args.rangestats.split(',')))
 
-decoder_map = {
-	'man': manchester_decode,
-	'diffman': differential_manchester_decode,
-	'raw': lambda s: s,
-}
-decoder_fn = decoder_map[args.encoding]
+decoder_fn = decoders[args.encoding]
 
+# Packets are aggregated as they stream in, into only the accumulators the
+# requested statistics need.
 packet_length_counts = defaultdict(int)
-unique_packet_counts = defaultdict(int)
 
-if args.length:
-	byte_stats = [defaultdict(int) for n in range(int(math.ceil(args.length / 8.0)) + 1)]
-	packet_first_byte_offset = args.length % 8
+if args.brutecrc:
+	if args.approximate:
+		unique_packet_counts = SpaceSavingCounter(args.approximate)
+	else:
+		unique_packet_counts = defaultdict(int)
+
+# Bit, range and byte statistics are computed a chunk of payloads at a
+# time, on a BitMatrix.
+matrix_chunk_size = 65536
 
-decoded_packets = []
+if args.bitstats:
+	# Bit statistics are over unique payloads.
+	if args.approximate:
+		seen_payloads = BloomFilter()
+	else:
+		seen_payloads = set()
+	bit_chunk = []
+	bit_ones = numpy.zeros((0,), dtype=numpy.int64)
+	bit_totals = numpy.zeros((0,), dtype=numpy.int64)
 
-packet_fields = ('timestamp', 'access_code', 'payload', 'modulation', 'carrier', 'deviation', 'symbol_rate', 'filename')
+# Range and byte statistics are weighted by packet counts.
+range_chunk = defaultdict(int)
+if args.rangestats:
+	range_stats = defaultdict(int)
+if args.bytestats is not None:
+	byte_stats = numpy.zeros((0, 256), dtype=numpy.int64)
+
+def flush_bit_chunk():
+	global bit_chunk, bit_ones, bit_totals
+	if bit_chunk:
+		ones, totals = BitMatrix.from_payloads(bit_chunk).bit_counts(weighted=False)
+		bit_ones = add_padded(bit_ones, ones)
+		bit_totals = add_padded(bit_totals, totals)
+	bit_chunk = []
+
+def flush_range_chunk():
+	global byte_stats
+	if range_chunk:
+		matrix = BitMatrix.from_counts(range_chunk)
+		if args.rangestats:
+			for key, count in matrix.range_histogram(*args.rangestats).items():
+				range_stats[key] += count
+		if args.bytestats is not None:
+			byte_stats = add_padded(byte_stats, matrix.byte_histograms(args.bytestats))
+	range_chunk.clear()
+
+def print_range_stats(start, stop, stats):
+	print('Range %d:%d' % (start, stop))
+	for key in sorted(stats, key=format_range_key):
+		width, value = key
+		print('%9x %12d %s: %3d %s' % (value, value, format_range_key(key), stats[key], '*' * stats[key]))
 
 packet_count = 0
 ruler_interval = 5
 
-for packet_line in sys.stdin:
-	packet_line = packet_line.strip()
-
-	# TODO: Hack to skip the VOLK message that GNU Radio insists on writing to stdout.
-	if packet_line.startswith('Using Volk machine: '):
-		continue
-
-	if len(packet_line) == 0:
-		continue
-
-	packet_line_split = packet_line.split()
-	if len(packet_line_split) > 1:
-		packet = dict(zip(packet_fields, packet_line_split))
-		packet['timestamp'] = iso8601.parse_date(packet['timestamp'])
-		packet['carrier'] = float(packet['carrier'])
-		packet['deviation'] = float(packet['deviation'])
-		packet['symbol_rate'] = float(packet['symbol_rate'])
-	else:
-		packet = {}
-		packet['payload'] = packet_line_split[0]
-
-	packet['payload'] = decoder_fn(packet['payload']).split('X')[0]
+for packet in iterate_packets(args.input):
+	# Payloads are kept as PackedBits from here on.
+	packet['payload'] = PackedBits.from_bits(truncate_invalid(decoder_fn(payload_bits(packet['payload']))))
 	if len(packet['payload']) == 0:
 		continue
 
@@ -102,15 +123,32 @@ for packet_line in sys.stdin:
 			continue
 		# Truncate
 		packet['payload'] = packet['payload'][:args.length]
-		bytes = tuple(split_string_bytes(packet['payload'], packet_first_byte_offset))
 
-		for n in range(len(bytes)):
-			byte_stats[n][bytes[n]] += 1
+	payload = packet['payload']
 
-	decoded_packets.append(packet)
+	packet_length_counts[len(payload)] += 1
 
-	packet_length_counts[len(packet['payload'])] += 1
-	unique_packet_counts[packet['payload']] += 1
+	if args.brutecrc:
+		if args.approximate:
+			unique_packet_counts.add(payload)
+		else:
+			unique_packet_counts[payload] += 1
+
+	if args.bitstats:
+		if args.approximate:
+			seen = seen_payloads.add(('%d:' % len(payload)).encode('ascii') + payload.tobytes())
+		else:
+			seen = payload in seen_payloads
+			seen_payloads.add(payload)
+		if not seen:
+			bit_chunk.append(payload)
+			if len(bit_chunk) >= matrix_chunk_size:
+				flush_bit_chunk()
+
+	if args.rangestats or args.bytestats is not None:
+		range_chunk[payload] += 1
+		if len(range_chunk) >= matrix_chunk_size:
+			flush_range_chunk()
 
 	if args.decoded:
 		if args.ruler and (packet_count % ruler_interval) == 0:
@@ -134,6 +172,10 @@ for packet_line in sys.stdin:
 
 	packet_count += 1
 
+if args.bitstats:
+	flush_bit_chunk()
+flush_range_chunk()
+
 # if unique_packet_counts:
 # 	print('Unique packets')
 # 	for payload in sorted(unique_packet_counts.keys(), key=lambda a: len(a)):
@@ -165,22 +207,20 @@ if args.lengthstats:
 	print
 
 if args.brutecrc:
-	for payload in sorted(unique_packet_counts.keys(), key=lambda a: unique_packet_counts[a], reverse=True):
-		count = unique_packet_counts[payload]
+	if args.approximate:
+		# Estimated counts, which may be overestimates.
+		counts = [(payload, count) for payload, count, error in unique_packet_counts.items()]
+	else:
+		counts = unique_packet_counts.items()
+	for payload, count in sorted(counts, key=lambda a: a[1], reverse=True):
 		if count > args.brutecrc:
 			print(payload)
 
 if args.bitstats:
 	print('Bit value statistics:')
-	bit_stats = defaultdict(lambda: [0, 0])
-	for payload in unique_packet_counts.keys():
-		for n in range(len(payload)):
-			value = payload[n]
-			bit_stats[n][int(value)] += 1
-	for n in sorted(bit_stats.keys()):
-		stats = bit_stats[n]
-		stat_h = stats[1]
-		stat_l = stats[0]
+	for n in range(len(bit_totals)):
+		stat_h = int(bit_ones[n])
+		stat_l = int(bit_totals[n] - bit_ones[n])
 		ratio_1 = float(stat_h) / float(stat_h + stat_l)
 		bar = '*' * int(round(ratio_1 * 20))
 		print('\t%3d: %4d/%4d %4d %5.1f%% %s' % (n, stat_h, stat_l, stat_h+stat_l, ratio_1 * 100, bar))
@@ -190,13 +230,15 @@ if args.rangestats:
 	if args.ruler:
 		s = ' ' * args.rangestats[0] + '^' * (args.rangestats[1] - args.rangestats[0])
 		print(s)
-	print('Range %d:%d' % args.rangestats)
-	range_stats = defaultdict(int)
-	for payload in unique_packet_counts.keys():
-		range_value = payload[args.rangestats[0]:args.rangestats[1]]
-		range_stats[range_value] += unique_packet_counts[payload]
-	for key in sorted(range_stats):
-		print('%9x %12d %s: %3d %s' % (int(key, 2), int(key, 2), key, range_stats[key], '*' * range_stats[key]))
+	print_range_stats(args.rangestats[0], args.rangestats[1], range_stats)
+	print
+
+if args.bytestats is not None:
+	print('Byte-aligned ranges:')
+	for n in range(len(byte_stats)):
+		start = args.bytestats + n * 8
+		values = numpy.flatnonzero(byte_stats[n])
+		print_range_stats(start, start + 8, dict(((8, int(value)), int(byte_stats[n][value])) for value in values))
 	print
 
 # if args.length:
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2013 Jared Boone
+#
+# This file is part of the TPMS project.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# Decodes packets with every registered protocol (see protocols.py).
+#
+# Packets are decoded a chunk at a time: payloads are stacked into a
+# symbol matrix (padded with INVALID), and each protocol's check and fields
+# are computed for all rows of the chunk at once.
+
+import itertools
+from argparse import ArgumentParser
+
+import numpy
+
+from bit_coding import *
+from packet_input import iterate_packets, payload_bits
+from crc_search import field_bytes, field_values, crc_values, checksum_values
+from protocols import protocols
+
+class ProtocolDecoder(object):
+	# A protocol definition compiled to whole-matrix operations.
+	def __init__(self, protocol):
+		self.name = protocol['name']
+		self.encoding = protocol['encoding']
+		self.fields = protocol['fields']
+		self.check = protocol['check']
+		ranges = [(field['start'], field['stop']) for field in self.fields]
+		ranges.append((self.check['start'], self.check['stop']))
+		ranges.append((self.check['field'], self.check['field'] + self.check['width']))
+		self.length = max(stop for start, stop in ranges)
+
+	def _check(self, bits):
+		check = self.check
+		data = field_bytes(bits, check['start'], check['stop'])
+		expected = field_values(bits, check['field'], check['width'])
+		if check['kind'] == 'crc':
+			calculated = crc_values(data, check['poly'], check['width'],
+				check['init'], check['refin'], check['refout'], check['xorout'],
+				bit_length=check['stop'] - check['start'])
+		else:
+			calculated = checksum_values(data, check['kind'], check['width'], check['offset'])
+		return calculated == expected
+
+	def decode(self, symbols):
+		# symbols is a (packets x bits) matrix of decoded symbols. Returns
+		# the indices of rows that pass the check, and a list of formatted
+		# values for each field, for those rows.
+		bits = symbols[:, :self.length]
+		if bits.shape[1] < self.length:
+			return numpy.zeros((0,), dtype=numpy.int64), [[] for field in self.fields]
+		rows = numpy.flatnonzero(~(bits == INVALID).any(axis=1))
+		bits = bits[rows]
+		passed = self._check(bits)
+		rows = rows[passed]
+		bits = bits[passed]
+
+		columns = []
+		for field in self.fields:
+			start, stop = field['start'], field['stop']
+			if field['type'] == 'bits':
+				columns.append([bits_to_string(row) for row in bits[:, start:stop]])
+			else:
+				values = field_values(bits, start, stop - start) * field['scale']
+				columns.append([field['format'] % value for value in values.tolist()])
+		return rows, columns
+
+def symbol_matrix(payloads, encoding):
+	# Decoded payloads, padded with INVALID to the longest.
+	width = max(len(payload) for payload in payloads)
+	raw = numpy.full((len(payloads), width), INVALID, dtype=numpy.uint8)
+	for n, payload in enumerate(payloads):
+		raw[n, :len(payload)] = payload
+	return decoders[encoding](raw)
+
+def decode_chunk(packets, decoders):
+	# Yields (packet, decoder, values) for each protocol each packet
+	# decodes with, in packet order.
+	payloads = [payload_bits(packet['payload']) for packet in packets]
+	symbols = {}
+	matches = []
+	for decoder in decoders:
+		if decoder.encoding not in symbols:
+			symbols[decoder.encoding] = symbol_matrix(payloads, decoder.encoding)
+		rows, columns = decoder.decode(symbols[decoder.encoding])
+		for n, values in zip(rows.tolist(), zip(*columns)):
+			matches.append((n, decoder, values))
+	for n, decoder, values in sorted(matches, key=lambda match: match[0]):
+		yield packets[n], decoder, values
+
+def decode_packets(source, names=None, chunk_size=65536):
+	# Yields (packet, decoder, values) for every packet from source and
+	# every named protocol (default all) it decodes with.
+	decoders = [ProtocolDecoder(protocols[name]) for name in (names or protocols)]
+	packets = iterate_packets(source)
+	while True:
+		chunk = list(itertools.islice(packets, chunk_size))
+		if not chunk:
+			break
+		for result in decode_chunk(chunk, decoders):
+			yield result
+
+def format_decoded(packet, decoder, values, show_protocol=True):
+	items = list(values)
+	if 'timestamp' in packet:
+		items.insert(0, packet['timestamp'].isoformat())
+	if show_protocol:
+		items.append(decoder.name)
+	return ' '.join(items)
+
+if __name__ == '__main__':
+	parser = ArgumentParser()
+	parser.add_argument('input', nargs='?', default=None, help="Text packet file or binary packet log (default: stdin)")
+	parser.add_argument('-p', '--protocol', action='append', choices=list(protocols), help="Protocol to try (may be repeated; default all)")
+	args = parser.parse_args()
+
+	for packet, decoder, values in decode_packets(args.input, args.protocol):
+		print(format_decoded(packet, decoder, values))
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2013 Jared Boone
+#
+# This file is part of the TPMS project.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# Registry of known packet protocols, for protocol_decode.py.
+#
+# A protocol is a dict:
+#   encoding: bit encoding of the payload (raw, man, diffman), as in
+#     packet_stats.py.
+#   fields: output fields, in output order. Each is a dict with the bit
+#     range start:stop of the decoded payload, and a type: 'bits' for the
+#     bit string, or 'uint' for the value times scale, printed with format.
+#   check: the CRC or checksum over data bits start:stop, which must equal
+#     the width-bit field at bit offset field. CRCs are in the Rocksoft
+#     model, as crc_search.py reports them (kind 'crc', with poly, init,
+#     refin, refout and xorout); checksums are a crc_search.py checksum kind
+#     with an offset.
+
+from collections import OrderedDict
+
+protocols = OrderedDict()
+
+def register(name, encoding, fields, check):
+	protocols[name] = {
+		'name': name,
+		'encoding': encoding,
+		'fields': fields,
+		'check': check,
+	}
+
+def bits_field(name, start, stop):
+	return {'name': name, 'type': 'bits', 'start': start, 'stop': stop}
+
+def uint_field(name, start, stop, scale=1, format='%d'):
+	return {'name': name, 'type': 'uint', 'start': start, 'stop': stop, 'scale': scale, 'format': format}
+
+def crc_check(start, stop, field, width, poly, init=0, refin=False, refout=False, xorout=0):
+	return {
+		'kind': 'crc',
+		'start': start, 'stop': stop, 'field': field, 'width': width,
+		'poly': poly, 'init': init, 'refin': refin, 'refout': refout, 'xorout': xorout,
+	}
+
+def checksum_check(kind, start, stop, field, width, offset=0):
+	return {
+		'kind': kind,
+		'start': start, 'stop': stop, 'field': field, 'width': width,
+		'offset': offset,
+	}
+
+# Bytes start at bit 1: four bytes of ID, two of unknown values, one of
+# flags, and a checksum.
+register('ride_1',
+	encoding='raw',
+	fields=(
+		bits_field('device_id', 1, 33),
+		uint_field('value_1', 33, 41),
+		uint_field('value_2', 41, 49),
+		uint_field('flags', 49, 57),
+	),
+	check=checksum_check('sum', 1, 57, 57, 8, offset=6),
+)
+
+# Bytes start at bit 5: pressure, temperature, four bytes of ID, flags,
+# and a CRC-8.
+register('ride_2',
+	encoding='raw',
+	fields=(
+		bits_field('device_id', 21, 53),
+		uint_field('pressure', 5, 13, scale=0.2, format='%.1f'),
+		uint_field('temperature', 13, 21),
+		uint_field('flags', 53, 61),
+	),
+	check=crc_check(5, 61, 61, 8, 0x07),
+)
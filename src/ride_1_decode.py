@@ -22,34 +22,8 @@
 #
 
 import sys
-from collections import defaultdict
 
-import pytz
-from iso8601 import iso8601
+from protocol_decode import decode_packets, format_decoded
 
-def split_string_bytes(data, start_offset):
-	for n in range(start_offset, len(data), 8):
-		yield data[n:n+8]
-
-decoded_data = []
-
-for packet_info in sys.stdin:
-	timestamp, access_code, payload, modulation, f_offset, deviation, bit_rate, filename = packet_info.split()
-	timestamp = iso8601.parse_date(timestamp)
-	payload_bytes_str = tuple(split_string_bytes(payload, 1))
-	payload_bytes = map(lambda v: int(v, 2), payload_bytes_str)
-	payload_str = ''.join(map(chr, payload_bytes))
-	device_id = ''.join(payload_bytes_str[0:4])
-	flags = payload_bytes[6]
-	calculated_checksum = (6 + sum(payload_bytes[0:7])) & 0xff
-	packet_checksum = payload_bytes[7]
-	checksum_ok = (calculated_checksum == packet_checksum)
-
-	if checksum_ok:
-		print('%s %s %d %d %d' % (
-			timestamp.isoformat(),
-			device_id,
-			payload_bytes[4],
-			payload_bytes[5],
-			flags,
-		))
+for packet, decoder, values in decode_packets(sys.argv[1] if len(sys.argv) > 1 else None, ['ride_1']):
+	print(format_decoded(packet, decoder, values, show_protocol=False))
@@ -26,13 +26,12 @@ from collections import defaultdict
 
 from matplotlib import pyplot
 
-from iso8601 import iso8601
+from packet_input import iterate_records
 
 decoded_data = []
-for line in sys.stdin:
-	line = line.split()
+for timestamp, line in iterate_records(sys.stdin):
 	item = {
-		'timestamp': iso8601.parse_date(line[0]),
+		'timestamp': timestamp,
 		'device_id': line[1],
 		'value_1': float(line[2]),
 		'value_2': float(line[3]),
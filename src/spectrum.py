@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2013 Jared Boone
+#
+# This file is part of the TPMS project.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# Windowed burst spectra, shared by packet_classify and burst_inspect.
+#
+# pyfftw plans and Hann windows are kept in small LRU caches keyed by
+# length, and bursts can be zero-padded to a power of two, so bursts of
+# similar length reuse the same plan.
+
+import math
+from collections import OrderedDict
+
+import numpy
+import scipy.signal
+import pyfftw
+
+class LRUCache(object):
+	def __init__(self, factory, capacity=32):
+		self._factory = factory
+		self._capacity = capacity
+		self._items = OrderedDict()
+
+	def __len__(self):
+		return len(self._items)
+
+	def __getitem__(self, key):
+		if key in self._items:
+			value = self._items.pop(key)
+		else:
+			value = self._factory(key)
+			if len(self._items) >= self._capacity:
+				self._items.popitem(last=False)
+		self._items[key] = value
+		return value
+
+def _make_plan(size):
+	fft_in = pyfftw.empty_aligned((size,), dtype='complex64', n=16)
+	fft_out = pyfftw.empty_aligned((size,), dtype='complex64', n=16)
+	return pyfftw.FFTW(fft_in, fft_out)
+
+def _make_window(length):
+	return scipy.signal.windows.hann(length, sym=True).astype(numpy.float32)
+
+fft_plans = LRUCache(_make_plan)
+windows = LRUCache(_make_window)
+
+def fast_fft_size(length, minimum_size=1):
+	# Next power of two at or above length.
+	return max(minimum_size, 1 << int(math.ceil(math.log(max(length, 1), 2))))
+
+def burst_spectrum(data, pad=True, minimum_size=1):
+	# Hann-windowed, fftshift()ed spectrum of data, zero-padded to a power
+	# of two unless pad is False. Frequency of bin n is
+	# (n / len(spectrum) - 0.5) * sampling_rate either way.
+	size = fast_fft_size(len(data), minimum_size) if pad else len(data)
+	fft = fft_plans[size]
+	fft.input_array[:len(data)] = data * windows[len(data)]
+	fft.input_array[len(data):] = 0
+	fft()
+	return numpy.fft.fftshift(fft.output_array)
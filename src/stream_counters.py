@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2013 Jared Boone
+#
+# This file is part of the TPMS project.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2, or (at your option)
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; see the file COPYING.  If not, write to
+# the Free Software Foundation, Inc., 51 Franklin Street,
+# Boston, MA 02110-1301, USA.
+#
+
+
+# Fixed-memory counters for statistics over unbounded packet streams.
+
+import heapq
+import hashlib
+import itertools
+
+import numpy
+
+class SpaceSavingCounter(object):
+	# Approximate heavy hitters ("Space-Saving", Metwally et al.): tracks at
+	# most capacity keys. An untracked key replaces the least-counted one
+	# and inherits its count, so counts are overestimates by at most the
+	# recorded error, and any key seen more than total / capacity times is
+	# guaranteed to be tracked.
+	def __init__(self, capacity):
+		self._capacity = capacity
+		self._counts = {}
+		self._errors = {}
+		# Min-heap of (count, sequence, key), with stale entries skipped.
+		self._heap = []
+		self._sequence = itertools.count()
+
+	def __len__(self):
+		return len(self._counts)
+
+	def _pop_min(self):
+		while True:
+			count, sequence, key = heapq.heappop(self._heap)
+			if self._counts.get(key) == count:
+				return count, key
+
+	def add(self, key, count=1):
+		if key in self._counts:
+			self._counts[key] += count
+		elif len(self._counts) < self._capacity:
+			self._counts[key] = count
+			self._errors[key] = 0
+		else:
+			min_count, min_key = self._pop_min()
+			del self._counts[min_key]
+			del self._errors[min_key]
+			self._counts[key] = min_count + count
+			self._errors[key] = min_count
+		heapq.heappush(self._heap, (self._counts[key], next(self._sequence), key))
+
+		if len(self._heap) > 4 * self._capacity:
+			self._heap = [(count, next(self._sequence), key) for key, count in self._counts.items()]
+			heapq.heapify(self._heap)
+
+	def items(self):
+		# (key, estimated count, maximum overestimate) for each tracked key.
+		return [(key, count, self._errors[key]) for key, count in self._counts.items()]
+
+class BloomFilter(object):
+	# Set membership in bit_count bits. add() returns whether the key was
+	# (probably) already present; false positives occur, false negatives
+	# do not.
+	def __init__(self, bit_count=1 << 24, hash_count=4):
+		if hash_count < 1:
+			raise ValueError('hash_count must be at least 1')
+		self._bits = numpy.zeros((bit_count,), dtype=numpy.bool_)
+		self._steps = numpy.arange(hash_count, dtype=numpy.uint64)
+
+	def _indices(self, key):
+		# Double hashing (Kirsch & Mitzenmacher): any number of indices from
+		# two 64-bit halves of one SHA-1 digest. An odd step never cycles
+		# early for power-of-two bit counts.
+		h1, h2 = numpy.frombuffer(hashlib.sha1(key).digest()[:16], dtype=numpy.uint64)
+		return (h1 + self._steps * (h2 | numpy.uint64(1))) % numpy.uint64(len(self._bits))
+
+	def __contains__(self, key):
+		return bool(self._bits[self._indices(key)].all())
+
+	def add(self, key):
+		indices = self._indices(key)
+		present = bool(self._bits[indices].all())
+		self._bits[indices] = True
+		return present
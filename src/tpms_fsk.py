@@ -35,16 +35,89 @@ import math
 import os
 import os.path
 import glob
+import heapq
 import datetime
+import multiprocessing
 from iso8601 import iso8601
 
 from collections import defaultdict
 
-from packet import Packetizer, packet_format, packet_classify
+from packet import packet_format, packet_classify
+from packed_bits import PackedBits
+from packet_log import PacketLogWriter, format_packet_line, packet_fields
 from numpy_block import *
+from burst_index import has_burst_index, cached_index
+from numpy_fsk import NumpyFSKDemodulator, fsk_taps, fsk_padding, padding_symbols, binary_slicer, access_code_packets
+from numpy_ask import NumpyASKDemodulator, ask_taps, ask_dc_length, ask_padding
+
+class BurstDemodulator(gr.top_block):
+	# Long-lived demodulator flowgraph: built once for a set of parameters,
+	# then fed any number of bursts through demodulate(). Subclasses build
+	# the flowgraph from self.source, through self.clock_recovery, to the
+	# self.symbols sink.
+	#
+	# Starting and stopping the flowgraph costs more than demodulating a
+	# short burst, so bursts run back-to-back, each followed by its padding.
+	# Clock recovery can't stray more than omega_relative_limit from omega,
+	# so a run is kept short enough that symbol positions estimated from
+	# NumpySource.offsets stay within a quarter of the padding. Each later
+	# burst in a run is then the window of its length with the most energy
+	# around its estimated position, as the padding demodulates to (near)
+	# zero.
+	def run_symbols(self):
+		return padding_symbols / 4.0 / self.omega_relative_limit
+
+	def burst_symbols(self, burst):
+		# Symbols in the burst and its padding, less the padding's own.
+		return int(round((len(burst) + self.padding) / self.omega)) - padding_symbols
+
+	def demodulate_run(self, bursts):
+		self.source.reset(bursts)
+		self.symbols.reset(int(math.ceil(self.source.length / self.omega)) + 1)
+		self.clock_recovery.set_omega(self.omega)
+		self.clock_recovery.set_mu(self.mu)
+		self.run()
+		symbols = self.symbols.data
+
+		starts = numpy.round(self.source.offsets / self.omega).astype(numpy.int64) - padding_symbols // 2
+		starts = numpy.clip(starts, 0, len(symbols))
+		ends = numpy.concatenate((starts[1:], [len(symbols)]))
 
-class FSKDemodulator(gr.top_block):
-	def __init__(self, source_data, sampling_rate, carrier_hz, symbol_rate, deviation, access_code):
+		results = []
+		for burst_n, (burst, start, end) in enumerate(zip(bursts, starts, ends)):
+			count = min(max(self.burst_symbols(burst), 0), end - start)
+			if burst_n > 0:
+				# The run starts exactly at the first burst; others are found.
+				energy = numpy.concatenate(([0], numpy.cumsum(numpy.abs(symbols[start:end]), dtype=numpy.float64)))
+				start += numpy.argmax(energy[count:] - energy[:len(energy) - count])
+			bits = binary_slicer(symbols[start:start + count])
+			results.append(access_code_packets(bits, self._access_code, self._access_code_threshold))
+		return results
+
+	def demodulate_burst(self, source_data):
+		return self.demodulate_run([source_data])[0]
+
+	def demodulate(self, bursts):
+		runs = []
+		run_symbols = 0
+		for burst in bursts:
+			symbols = self.burst_symbols(burst) + padding_symbols
+			if not runs or run_symbols + symbols > self.run_symbols():
+				runs.append([])
+				run_symbols = 0
+			runs[-1].append(burst)
+			run_symbols += symbols
+
+		results = []
+		for run in runs:
+			for packets in self.demodulate_run(run):
+				if self._callback is not None:
+					self._callback(len(results), packets)
+				results.append(packets)
+		return results
+
+class FSKDemodulator(BurstDemodulator):
+	def __init__(self, sampling_rate, carrier_hz, symbol_rate, deviation, access_code, callback=None, access_code_threshold=0):
 		super(FSKDemodulator, self).__init__()
 
 		self._decoded = {}
@@ -52,29 +125,25 @@ class FSKDemodulator(gr.top_block):
 		self._carrier_hz = carrier_hz
 		self._deviation = deviation
 		self._access_code = access_code
+		self._access_code_threshold = access_code_threshold
+		self._callback = callback
 
 		samp_rate = sampling_rate
 		#symbol_rate = 9920
 		self.samples_per_symbol = float(samp_rate) / symbol_rate
 
-		omega = self.samples_per_symbol * 1.0
-		mu = 0.0
+		self.omega = omega = self.samples_per_symbol * 1.0
+		self.mu = mu = 0.0
 		gain_mu = 0.2
 		gain_omega = 0.25 * gain_mu * gain_mu
-		omega_relative_limit = 0.001
+		self.omega_relative_limit = omega_relative_limit = 0.001
 
-		tap_count = int(math.floor(self.samples_per_symbol))
-
-		hz_n = (carrier_hz - deviation)
-		taps_n = numpy.exp(numpy.arange(tap_count, dtype=numpy.float32) * 2.0j * numpy.pi * hz_n / samp_rate)
-		hz_p = (carrier_hz + deviation)
-		taps_p = numpy.exp(numpy.arange(tap_count, dtype=numpy.float32) * 2.0j * numpy.pi * hz_p / samp_rate)
+		taps_n, taps_p = fsk_taps(samp_rate, carrier_hz, deviation, symbol_rate)
 
 		#source = blocks.file_source(gr.sizeof_gr_complex*1, filepath_in, False)
-		# Concatenate data to compensate for correlate_access_code_bb latency
-		source_data_padding_count = int(math.ceil(self.samples_per_symbol * 64))
-		source_data = numpy.concatenate((source_data, numpy.zeros((source_data_padding_count,), dtype=numpy.complex64)))
-		source = NumpySource(source_data)
+		# Pad data to flush the filters and clock recovery
+		self.padding = fsk_padding(samp_rate, symbol_rate)
+		self.source = source = NumpySource([], self.padding, numpy.complex64)
 
 		filter_n = filter.fir_filter_ccc(1, taps_n.tolist())
 		self.connect(source, filter_n)
@@ -90,17 +159,11 @@ class FSKDemodulator(gr.top_block):
 		self.connect(mag_p, (sub_pn, 0))
 		self.connect(mag_n, (sub_pn, 1))
 
-		clock_recovery = digital.clock_recovery_mm_ff(omega, gain_omega, mu, gain_mu, omega_relative_limit)
+		self.clock_recovery = clock_recovery = digital.clock_recovery_mm_ff(omega, gain_omega, mu, gain_mu, omega_relative_limit)
 		self.connect(sub_pn, clock_recovery)
 
-		slicer = digital.binary_slicer_fb()
-		self.connect(clock_recovery, slicer)
-
-		access_code_correlator = digital.correlate_access_code_bb(access_code, 0)
-		self.connect(slicer, access_code_correlator)
-
-		self.packetizer = Packetizer()
-		self.connect(access_code_correlator, self.packetizer)
+		self.symbols = NumpySink(numpy.float32)
+		self.connect(clock_recovery, self.symbols)
 
 		# sink_n = blocks.file_sink(gr.sizeof_float*1, 'out_n.rfile')
 		# self.connect(mag_n, sink_n)
@@ -112,115 +175,325 @@ class FSKDemodulator(gr.top_block):
 		# self.connect(clock_recovery, sink_sync)
 		# sink_slicer = blocks.file_sink(gr.sizeof_char*1, 'out_slicer.u8')
 		# self.connect(slicer, sink_slicer)
-		# sink_correlator = blocks.file_sink(gr.sizeof_char*1, 'out_correlator.u8')
-		# self.connect(access_code_correlator, sink_correlator)
 
-	@property
-	def packets(self):
+class ASKDemodulator(BurstDemodulator):
+	def __init__(self, sampling_rate, carrier_hz, symbol_rate, access_code, callback=None, access_code_threshold=0):
+		super(ASKDemodulator, self).__init__()
+
+		self._carrier_hz = carrier_hz
+		self._access_code = access_code
+		self._access_code_threshold = access_code_threshold
+		self._callback = callback
+
+		self.samples_per_symbol = float(sampling_rate) / symbol_rate
+
+		self.omega = omega = self.samples_per_symbol * 1.0
+		self.mu = mu = 0.5
+		gain_mu = 0.03
+		gain_omega = 0.25 * gain_mu * gain_mu
+		self.omega_relative_limit = omega_relative_limit = 0.0002
+
+		taps = ask_taps(sampling_rate, carrier_hz, symbol_rate)
+
+		self.padding = ask_padding(sampling_rate, symbol_rate)
+		self.source = source = NumpySource([], self.padding, numpy.complex64)
+
+		carrier_filter = filter.fir_filter_ccc(1, taps.tolist())
+		self.connect(source, carrier_filter)
+
+		mag = blocks.complex_to_mag(1)
+		self.connect(carrier_filter, mag)
+
+		dc_blocker = filter.dc_blocker_ff(ask_dc_length(sampling_rate, symbol_rate), True)
+		self.connect(mag, dc_blocker)
+
+		self.clock_recovery = clock_recovery = digital.clock_recovery_mm_ff(omega, gain_omega, mu, gain_mu, omega_relative_limit)
+		self.connect(dc_blocker, clock_recovery)
+
+		self.symbols = NumpySink(numpy.float32)
+		self.connect(clock_recovery, self.symbols)
+
+fsk_engines = {
+	'gnuradio': FSKDemodulator,
+	'numpy': NumpyFSKDemodulator,
+}
+
+ask_engines = {
+	'gnuradio': ASKDemodulator,
+	'numpy': NumpyASKDemodulator,
+}
+
+def list_bursts(data_path):
+	# Returns (timestamp, filename, key) for each burst in a directory of
+	# extracted .dat files, or in a capture file with a burst index, in
+	# timestamp order. The key is cheap to pickle; read_burst() loads it.
+	if has_burst_index(data_path):
+		index = cached_index(data_path)
+		return [(index.timestamp(n), os.path.basename(index.reference(n)), n) for n in range(len(index))]
+
+	path_glob = os.path.join(data_path, '*.dat')
+	files = glob.glob(path_glob)
+
+	start_timestamp_path = os.path.join(data_path, 'timestamp.txt')
+	start_timestamp = open(start_timestamp_path).read()
+	start_timestamp = iso8601.parse_date(start_timestamp)
+
+	bursts = []
+	for path in files:
+		head, tail = os.path.split(path)
+		filename = tail
+
+		offset_seconds = filename.split('_')[2]
+		offset_seconds = float(offset_seconds.split('.dat')[0])
+		burst_timestamp = start_timestamp + iso8601.timedelta(seconds=offset_seconds)
+
+		bursts.append((burst_timestamp, filename, path))
+	bursts.sort(key=lambda burst: burst[0])
+	return bursts
+
+def merge_bursts(data_paths):
+	# Bursts from every data path as (timestamp, filename, data_path, key), in
+	# timestamp order across all of them rather than per path.
+	burst_lists = [[(burst_timestamp, filename, data_path, key) for burst_timestamp, filename, key in list_bursts(data_path)] for data_path in data_paths]
+	return heapq.merge(*burst_lists)
+
+def read_burst(data_path, key):
+	if has_burst_index(data_path):
+		return cached_index(data_path).samples(key)
+	return numpy.fromfile(key, dtype=numpy.complex64)
+
+# Demodulators are long-lived, one per engine and set of parameters.
+demodulators = {}
+
+def get_demodulator(engines, engine, *parameters, **kwargs):
+	key = (engines[engine],) + parameters + tuple(sorted(kwargs.items()))
+	if key not in demodulators:
+		demodulators[key] = engines[engine](*parameters, **kwargs)
+	return demodulators[key]
+
+def packet_results(packet_info, burst_packets, deviation):
+	burst_results = []
+	for packets in burst_packets:
 		results = []
-		data = self.packetizer.data
-		#print('P %s' % ''.join(map(str, data)))
-		for i in range(len(data)):
-			symbol = data[i]
-			if symbol & 2:
-				if len(data[i:]) >= 64:
-					access_code_n = i - len(self._access_code)
-					result = (
-						data[access_code_n:i] & 1,
-						data[i:] & 1,
-					)
-					results.append(result)
-		return results[-1:]
-
-def demodulate_ask(packet_info, source_data):
-	return False
-
-def demodulate_fsk(packet_info, source_data):
+		for actual_access_code, data, offset, score in packets:
+			results.append({
+				'decoder': 'raw',
+				'data': PackedBits.from_bits(data),
+				'carrier': packet_info['carrier'],
+				'modulation': packet_info['modulation'],
+				'symbol_rate': packet_info['symbol_rate'],
+				'deviation': deviation,
+				'access_code': packet_info['preamble'],
+				'actual_access_code': PackedBits.from_bits(actual_access_code),
+				'offset': offset,
+				'score': score,
+			})
+		burst_results.append(results)
+	return burst_results
+
+def demodulate_ask(packet_info, bursts):
+	sampling_rate = packet_info['sampling_rate']
 	symbol_rate = packet_info['symbol_rate']
 	access_code = packet_info['preamble']
 	carrier_hz = packet_info['carrier']
-	deviation = packet_info['deviation']
+	access_code_threshold = packet_info.get('access_code_threshold', 0)
+
+	demodulator = get_demodulator(ask_engines, packet_info.get('engine', 'gnuradio'),
+		sampling_rate, carrier_hz, symbol_rate, access_code,
+		access_code_threshold=access_code_threshold)
+
+	return packet_results(packet_info, demodulator.demodulate(bursts), 0)
 
-	demodulator = FSKDemodulator(source_data, sampling_rate, carrier_hz, symbol_rate, deviation, access_code)
-	demodulator.run()
-
-	packets = demodulator.packets
-	results = []
-	for actual_access_code, data in packets:
-		results.append({
-			'decoder': 'raw',
-			'data': ''.join(map(str, data)),
-			'carrier': carrier_hz,
-			'modulation': 'fsk',
-			'symbol_rate': symbol_rate,
-			'deviation': deviation,
-			'access_code': access_code,
-			'actual_access_code': ''.join(map(str, actual_access_code)),
-		})
-
-	return results
+def demodulate_fsk(packet_info, bursts):
+	sampling_rate = packet_info['sampling_rate']
+	symbol_rate = packet_info['symbol_rate']
+	access_code = packet_info['preamble']
+	carrier_hz = packet_info['carrier']
+	deviation = packet_info['deviation']
+	access_code_threshold = packet_info.get('access_code_threshold', 0)
+
+	demodulator = get_demodulator(fsk_engines, packet_info.get('engine', 'gnuradio'),
+		sampling_rate, carrier_hz, symbol_rate, deviation, access_code,
+		access_code_threshold=access_code_threshold)
+
+	return packet_results(packet_info, demodulator.demodulate(bursts), deviation)
+
+def iterate_batches(iterable, batch_size):
+	batch = []
+	for item in iterable:
+		batch.append(item)
+		if len(batch) == batch_size:
+			yield batch
+			batch = []
+	if batch:
+		yield batch
+
+def demodulate_by_modulation(packet_info, bursts):
+	if packet_info['modulation'] == 'ask':
+		return demodulate_ask(packet_info, bursts)
+	elif packet_info['modulation'] == 'fsk':
+		return demodulate_fsk(packet_info, bursts)
+	else:
+		return [[] for source_data in bursts]
+
+class BurstClassifier(object):
+	# Estimates each burst's modulation and parameters with packet_classify.
+	# Estimates are snapped to a resolution_hz grid, so that bursts from one
+	# sensor usually share parameters (and a cached demodulator). Bursts are
+	# also grouped into clusters cluster_hz wide; the first parameters that
+	# decode packets in a cluster are used for all later bursts in it.
+	def __init__(self, packet_info, resolution_hz=500.0, cluster_hz=5e3):
+		self._defaults = packet_info
+		self._resolution_hz = resolution_hz
+		self._cluster_hz = cluster_hz
+		self._clusters = {}
+
+	def _snap(self, hz, step):
+		return round(float(hz) / step) * step
+
+	def classify(self, source_data):
+		# Returns (cluster, packet_info) for the burst.
+		estimate = packet_classify(source_data, self._defaults['sampling_rate'])
+		packet_info = dict(self._defaults)
+		packet_info['modulation'] = estimate['modulation']
+		packet_info['carrier'] = self._snap(estimate['carrier'], self._resolution_hz)
+		if estimate['modulation'] == 'fsk':
+			packet_info['deviation'] = self._snap(estimate['deviation'], self._resolution_hz)
+		else:
+			packet_info['deviation'] = 0
+			if not packet_info['symbol_rate']:
+				packet_info['symbol_rate'] = self._snap(estimate['baud_rate'], 100.0)
+
+		cluster = (
+			packet_info['modulation'],
+			self._snap(packet_info['carrier'], self._cluster_hz),
+			self._snap(packet_info['deviation'], self._cluster_hz),
+		)
+		return cluster, self._clusters.get(cluster, packet_info)
+
+	def confirm(self, cluster, packet_info):
+		if cluster not in self._clusters:
+			self._clusters[cluster] = packet_info
+
+# One classifier per set of command-line parameters, in each process.
+classifiers = {}
+
+def get_classifier(packet_info):
+	key = tuple(sorted(packet_info.items()))
+	if key not in classifiers:
+		classifiers[key] = BurstClassifier(packet_info)
+	return classifiers[key]
+
+def demodulate_auto(packet_info, bursts):
+	# Classifies each burst, then demodulates bursts with identical
+	# parameters together as one batch.
+	classifier = get_classifier(packet_info)
+	groups = defaultdict(list)
+	for n, source_data in enumerate(bursts):
+		cluster, burst_packet_info = classifier.classify(source_data)
+		if not burst_packet_info['symbol_rate']:
+			continue
+		groups[tuple(sorted(burst_packet_info.items()))].append((n, cluster))
+
+	burst_results = [[] for source_data in bursts]
+	for group_key, members in groups.items():
+		burst_packet_info = dict(group_key)
+		group_results = demodulate_by_modulation(burst_packet_info, [bursts[n] for n, cluster in members])
+		for (n, cluster), results in zip(members, group_results):
+			burst_results[n] = results
+			if results:
+				classifier.confirm(cluster, burst_packet_info)
+	return burst_results
+
+def decode_batch(packet_info, batch):
+	# Demodulates a list of (timestamp, filename, samples) bursts, returning
+	# packets for all of them, in order, with the fields of an output line.
+	bursts = [source_data for burst_timestamp, filename, source_data in batch]
+	if packet_info['modulation'] == 'auto':
+		batch_results = demodulate_auto(packet_info, bursts)
+	else:
+		batch_results = demodulate_by_modulation(packet_info, bursts)
+
+	packets = []
+	for (burst_timestamp, filename, source_data), results in zip(batch, batch_results):
+		for result in results:
+			packets.append({
+				'timestamp': burst_timestamp,
+				'access_code': result['access_code'],
+				'payload': result['data'],
+				'modulation': result['modulation'],
+				'carrier': result['carrier'],
+				'deviation': result['deviation'],
+				'symbol_rate': result['symbol_rate'],
+				'filename': filename,
+			})
+	return packets
+
+def decode_task(task):
+	# Pool worker: each process keeps its own demodulator cache, and loads
+	# burst samples itself rather than receiving them through a pipe.
+	packet_info, items = task
+	batch = [(burst_timestamp, filename, read_burst(data_path, key)) for burst_timestamp, filename, data_path, key in items]
+	return decode_batch(packet_info, batch)
 
 if __name__ == '__main__':
 	parser = ArgumentParser()
-	parser.add_argument('burst_directory', nargs='+', type=str)
+	parser.add_argument('burst_directory', nargs='+', type=str, help="Burst directories, or capture files with a burst index")
 	parser.add_argument('-r', '--rate', type=float, help="Sampling rate of data files")
-	parser.add_argument('-m', '--modulation', type=str, default='fsk', help="Modulation type (fsk")
+	parser.add_argument('-m', '--modulation', type=str, default='fsk', help="Modulation type (fsk, ask, or auto to classify each burst)")
 	parser.add_argument('-c', '--carrier', type=float, help="Carrier frequency within data files")
 	parser.add_argument('-d', '--deviation', type=float, help="Frequency deviation")
 	parser.add_argument('-p', '--preamble', type=str, help="Packet preamble or access code")
 	parser.add_argument('-s', '--symbol-rate', type=float, help="Symbol rate")
+	parser.add_argument('-t', '--access-code-threshold', type=int, default=0, help="Access code bit errors tolerated")
+	parser.add_argument('--engine', type=str, default='gnuradio', choices=sorted(fsk_engines), help="Demodulator implementation (numpy needs no GNU Radio; see numpy_fsk.py)")
+	parser.add_argument('--batch-size', type=int, default=64, help="Bursts read and demodulated together, per task")
+	parser.add_argument('-j', '--jobs', type=int, default=1, help="Number of worker processes")
+	parser.add_argument('-o', '--packet-log', type=str, default=None, help="Also append packets to this binary packet log")
 	args = parser.parse_args()
 
 	sampling_rate = args.rate
 
-	for data_path in args.burst_directory:
-		path_glob = os.path.join(data_path, '*.dat')
-		files = glob.glob(path_glob)
-
-		start_timestamp_path = os.path.join(data_path, 'timestamp.txt')
-		start_timestamp = open(start_timestamp_path).read()
-		start_timestamp = iso8601.parse_date(start_timestamp)
-
-		for path in files:
-			head, tail = os.path.split(path)
-			filename = tail
-
-			offset_seconds = filename.split('_')[2]
-			offset_seconds = float(offset_seconds.split('.dat')[0])
-			burst_timestamp = start_timestamp + iso8601.timedelta(seconds=offset_seconds)
-
-			source_data = numpy.fromfile(path, dtype=numpy.complex64)
-			#packet_info = packet_classify(source_data, sampling_rate)
-
-			packet_info = {
-				'modulation': args.modulation.lower(),
-				'carrier': args.carrier,
-				'deviation': args.deviation,
-				'symbol_rate': args.symbol_rate,
-				'preamble': args.preamble,
-			}
-
-			results = []
-			if packet_info['modulation'] == 'ask':
-				results = demodulate_ask(packet_info, source_data)
-			elif packet_info['modulation'] == 'fsk':
-				results = demodulate_fsk(packet_info, source_data)
-			else:
-				continue
-
-			for result in results:
-				data = result['data']
-
-				print('%s %s %s %s %d %d %d %s' % (
-					burst_timestamp.isoformat(),
-					result['access_code'],
-					data,
-					result['modulation'],
-					result['carrier'],
-					result['deviation'],
-					result['symbol_rate'],
-					filename,
-				))
+	# With --modulation auto, packet_classify estimates modulation, carrier
+	# and deviation per burst (see BurstClassifier).
+	packet_info = {
+		'sampling_rate': sampling_rate,
+		'modulation': args.modulation.lower(),
+		'carrier': args.carrier,
+		'deviation': args.deviation,
+		'symbol_rate': args.symbol_rate,
+		'preamble': args.preamble,
+		'access_code_threshold': args.access_code_threshold,
+		'engine': args.engine,
+	}
+
+	tasks = [(packet_info, items) for items in iterate_batches(merge_bursts(args.burst_directory), args.batch_size)]
+
+	# Batches are in timestamp order; imap() keeps results in task order.
+	if args.jobs > 1:
+		pool = multiprocessing.Pool(args.jobs)
+		results = pool.imap(decode_task, tasks)
+	else:
+		pool = None
+		results = map(decode_task, tasks)
+
+	packet_log = PacketLogWriter(args.packet_log) if args.packet_log else None
+
+	for packets in results:
+		for packet in packets:
+			print(format_packet_line(packet))
+			if packet_log is not None:
+				try:
+					packet_log.write(*[packet[field] for field in packet_fields])
+				except ValueError as e:
+					sys.stderr.write('%s: packet not logged: %s\n' % (args.packet_log, e))
+
+	if packet_log is not None:
+		packet_log.close()
+
+	if pool is not None:
+		pool.close()
+		pool.join()
 
 	# from pylab import *
 
@@ -0,0 +1,65 @@
+import numpy
+import pytest
+
+from bit_coding import manchester_decode, differential_manchester_decode, string_to_bits, bits_to_string, truncate_invalid, decoders, INVALID
+
+def string_to_symbols(s, symbol_length):
+	return [s[n:n+symbol_length] for n in range(0, len(s), symbol_length)]
+
+# The string decoders these replaced, kept as a reference.
+def reference_differential_manchester_decode(s):
+	last_bit = '0'
+	result = []
+	for symbol in string_to_symbols(s, 2):
+		if len(symbol) == 2:
+			if symbol[0] == symbol[1]:
+				result.append('X')
+			elif last_bit != symbol[0]:
+				result.append('0')
+			else:
+				result.append('1')
+			last_bit = symbol[1]
+		else:
+			result.append('X')
+	return ''.join(result)
+
+def reference_manchester_decode(s):
+	result = []
+	for symbol in string_to_symbols(s, 2):
+		if len(symbol) == 2:
+			if symbol[0] == symbol[1]:
+				result.append('X')
+			else:
+				result.append(symbol[1])
+		else:
+			result.append('X')
+	return ''.join(result)
+
+def random_strings(count=200, seed=0):
+	random = numpy.random.RandomState(seed)
+	return [''.join(random.choice(['0', '1'], random.randint(0, 40))) for n in range(count)]
+
+def test_manchester_matches_reference():
+	for s in random_strings():
+		assert manchester_decode(s) == reference_manchester_decode(s)
+
+def test_differential_manchester_matches_reference():
+	for s in random_strings():
+		assert differential_manchester_decode(s) == reference_differential_manchester_decode(s)
+
+@pytest.mark.parametrize('encoding', ['man', 'diffman'])
+def test_matrix_decode_matches_rows(encoding):
+	bits = numpy.random.RandomState(1).randint(0, 2, (20, 33)).astype(numpy.uint8)
+	decoded = decoders[encoding](bits)
+	for row, decoded_row in zip(bits, decoded):
+		assert numpy.array_equal(decoders[encoding](row), decoded_row)
+
+def test_string_round_trip():
+	assert bits_to_string(string_to_bits('0110')) == '0110'
+	assert bits_to_string(numpy.array([0, 1, INVALID], dtype=numpy.uint8)) == '01X'
+
+def test_truncate_invalid():
+	symbols = string_to_bits('0110')
+	assert numpy.array_equal(truncate_invalid(symbols), symbols)
+	symbols = numpy.array([1, 0, INVALID, 1], dtype=numpy.uint8)
+	assert list(truncate_invalid(symbols)) == [1, 0]
@@ -0,0 +1,45 @@
+import os
+
+import numpy
+import pytest
+
+from burst_index import index_capture, cached_index, load_burst, delete_burst, loaded_indexes
+
+capture_name = 'tpms_315.000m_1.000m_20140101_000000z_hackrf.cfile'
+
+def write_capture(directory):
+	n = numpy.arange(100000)
+	samples = numpy.random.RandomState(0).randn(len(n)) * 0.01
+	samples = samples.astype(numpy.complex64)
+	for start in (20000, 60000):
+		samples[start:start + 10000] += numpy.exp(2j * numpy.pi * 0.1 * n[start:start + 10000])
+	path = os.path.join(directory, capture_name)
+	samples.tofile(path)
+	return path
+
+def test_load_burst_reuses_index(tmpdir):
+	path = write_capture(str(tmpdir))
+	index = index_capture(path)
+	assert len(index) == 2
+	reference = index.reference(0)
+	samples = load_burst(reference)
+	assert numpy.array_equal(samples, index.samples(0))
+	assert loaded_indexes[path][1] is cached_index(path)
+
+def test_delete_burst_updates_cached_index(tmpdir):
+	path = write_capture(str(tmpdir))
+	index = index_capture(path)
+	first, second = index.reference(0), index.reference(1)
+	load_burst(first)
+	delete_burst(first)
+	with pytest.raises(KeyError):
+		load_burst(first)
+	assert len(load_burst(second)) == index.bursts['length'][1]
+
+def test_rewritten_index_is_reloaded(tmpdir):
+	path = write_capture(str(tmpdir))
+	index = index_capture(path)
+	assert len(cached_index(path)) == 2
+	index.remove(0)
+	index.save()
+	assert len(cached_index(path)) == 1
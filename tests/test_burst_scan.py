@@ -0,0 +1,51 @@
+import numpy
+
+from burst_scan import BurstScanner, NoiseFloorTracker
+
+def tone_burst(block_size=256, start_block=20, stop_block=40, block_count=64):
+	random = numpy.random.RandomState(0)
+	length = block_count * block_size
+	samples = (random.randn(length) + 1j * random.randn(length)) * 0.01
+	n = numpy.arange(start_block * block_size, stop_block * block_size)
+	samples[n] += numpy.exp(2j * numpy.pi * 0.1 * n)
+	return samples.astype(numpy.complex64)
+
+def test_scanner_finds_tone_burst():
+	scanner = BurstScanner()
+	records = scanner.bursts(scanner.spreads(tone_burst()))
+	assert len(records) == 1
+	# Bursts open a block early, and close after the hysteresis timeout.
+	assert records[0]['start_sample'] == 19 * 256
+	assert records[0]['end_sample'] == (40 + 3 - 1) * 256
+	assert records[0]['peak_spread'] > 10
+
+def test_scanner_quiet_capture():
+	scanner = BurstScanner()
+	samples = tone_burst(start_block=0, stop_block=0)
+	assert len(scanner.scan(samples)) == 0
+
+def capture_starting_mid_burst(block_size=256, burst_count=14):
+	# A long burst already under way at the first block, then short bursts
+	# of varying strength.
+	random = numpy.random.RandomState(1)
+	spans = [(0, 300)] + [(400 + 60 * n, 420 + 60 * n) for n in range(burst_count - 1)]
+	length = (spans[-1][1] + 100) * block_size
+	samples = (random.randn(length) + 1j * random.randn(length)) * 0.01
+	for n, (start, stop) in enumerate(spans):
+		k = numpy.arange(start * block_size, stop * block_size)
+		samples[k] += (0.05 + 0.02 * n) * numpy.exp(2j * numpy.pi * 0.1 * k)
+	return samples.astype(numpy.complex64), len(spans)
+
+def test_adaptive_scan_of_capture_starting_mid_burst():
+	samples, burst_count = capture_starting_mid_burst()
+	assert len(BurstScanner().scan(samples)) == burst_count
+	assert len(BurstScanner(adaptive=True).scan(samples)) == burst_count
+
+def test_noise_floor_ignores_bursts():
+	tracker = NoiseFloorTracker()
+	spreads = numpy.full((5000,), 3.0)
+	spreads[:300] = 40.0
+	spreads[1000:1020] = 40.0
+	rise, fall = tracker.thresholds(spreads)
+	assert rise.max() <= 12
+	assert abs(tracker.level - 3.0) < 0.1
@@ -0,0 +1,43 @@
+import os
+
+import numpy
+import pytest
+
+from channelizer import PolyphaseChannelizer, channelize_capture
+from burst_index import BurstIndex, burst_index_dtype, index_path, timestamp_to_ns, parse_capture_filename
+
+capture_name = 'tpms_315.000m_1.000m_20140101_000000z_hackrf.cfile'
+
+def write_capture(directory):
+	n = numpy.arange(200000)
+	samples = numpy.random.RandomState(0).randn(len(n)) * 0.01
+	samples = samples.astype(numpy.complex64)
+	samples[80000:120000] += numpy.exp(2j * numpy.pi * 0.01 * n[80000:120000])
+	path = os.path.join(directory, capture_name)
+	samples.tofile(path)
+	return path
+
+def test_single_channel_refuses_to_overwrite_capture(tmpdir):
+	path = write_capture(str(tmpdir))
+	with pytest.raises(RuntimeError):
+		channelize_capture(path, 1)
+	assert os.path.getsize(path) == 200000 * 8
+
+def test_burst_timestamps_allow_for_group_delay(tmpdir):
+	path = write_capture(str(tmpdir))
+	output = str(tmpdir.mkdir('channels'))
+	indices = channelize_capture(path, 4, output)
+	index = [index for index in indices if len(index)][0]
+	start_ns = timestamp_to_ns(parse_capture_filename(path)[2])
+	delay = PolyphaseChannelizer(4).group_delay
+	expected = start_ns + numpy.round((index.bursts['start_sample'] - delay) * 4e3).astype(numpy.int64)
+	assert numpy.array_equal(index.bursts['timestamp'], expected)
+
+def test_loads_index_without_center_frequency(tmpdir):
+	path = write_capture(str(tmpdir))
+	bursts = numpy.zeros((0,), dtype=burst_index_dtype)
+	with open(index_path(path), 'wb') as f:
+		numpy.savez(f, bursts=bursts, sampling_rate=numpy.float64(1e6), start_timestamp=numpy.int64(0))
+	index = BurstIndex.load(path)
+	assert index.center_frequency == 315e6
+	assert index.sampling_rate == 1e6
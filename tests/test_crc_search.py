@@ -0,0 +1,49 @@
+import numpy
+import pytest
+
+from crc_search import crc_values, checksum_values, search_crc, search_checksums
+
+check_data = numpy.frombuffer(b'123456789', dtype=numpy.uint8).reshape(1, -1)
+
+# Check values from the CRC catalogue, for '123456789'.
+@pytest.mark.parametrize('width, poly, init, refin, refout, xorout, check', [
+	(8, 0x07, 0x00, False, False, 0x00, 0xf4),
+	(8, 0x31, 0x00, True, True, 0x00, 0xa1),
+	(16, 0x1021, 0xffff, False, False, 0x0000, 0x29b1),
+	(16, 0x1021, 0x0000, True, True, 0x0000, 0x2189),
+	(16, 0x8005, 0x0000, True, True, 0x0000, 0xbb3d),
+	(16, 0x1021, 0x0000, False, False, 0xffff, 0xce3c),
+])
+def test_crc_catalogue(width, poly, init, refin, refout, xorout, check):
+	assert crc_values(check_data, poly, width, init, refin, refout, xorout)[0] == check
+
+def random_packets(count=64, length=6, seed=0):
+	return numpy.random.RandomState(seed).randint(0, 256, (count, length)).astype(numpy.uint8)
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_search_finds_crc8(jobs):
+	data = random_packets()
+	targets = crc_values(data, 0x07, 8)
+	results = list(search_crc(data, targets, 8, data.shape[1] * 8, jobs=jobs, chunk_size=64))
+	assert {'width': 8, 'poly': 0x07, 'refin': False, 'refout': False, 'xorout': 0, 'no_xorout_init': 0} in results
+
+def test_search_finds_crc16_init():
+	data = random_packets()
+	targets = crc_values(data, 0x1021, 16, init=0xffff)
+	results = [result for result in search_crc(data, targets, 16, data.shape[1] * 8) if result['poly'] == 0x1021]
+	assert len(results) == 1
+	assert not results[0]['refin'] and not results[0]['refout']
+	assert results[0]['no_xorout_init'] == 0xffff
+
+def test_search_finds_checksum_offset():
+	data = random_packets()
+	targets = checksum_values(data, 'sum', 8, offset=6)
+	assert {'kind': 'sum', 'width': 8, 'offset': 6} in list(search_checksums(data, targets, 8))
+
+def test_checksum_kinds():
+	data = numpy.array([[1, 2, 0xff]], dtype=numpy.uint8)
+	assert checksum_values(data, 'sum', 8)[0] == 0x02
+	assert checksum_values(data, 'negsum', 8)[0] == 0xfe
+	assert checksum_values(data, 'xor', 8)[0] == 0xfc
+	# An odd byte count is zero-padded at the front.
+	assert checksum_values(data, 'sum', 16)[0] == 0x0001 + 0x02ff
@@ -0,0 +1,109 @@
+import numpy
+import pytest
+
+from numpy_fsk import NumpyFSKDemodulator, access_code_packets, interpolator_weights
+
+sampling_rate = 400e3
+carrier_hz = 20e3
+deviation = 40e3
+symbol_rate = 20e3
+access_code = '01010101010101010101010101011110'
+
+def fsk_burst(bits, noise_seed):
+	samples_per_symbol = int(sampling_rate / symbol_rate)
+	symbols = numpy.repeat(numpy.asarray(bits) * 2 - 1, samples_per_symbol)
+	phase = numpy.cumsum(2.0 * numpy.pi * (carrier_hz + deviation * symbols) / sampling_rate)
+	random = numpy.random.RandomState(noise_seed)
+	noise = (random.randn(len(phase)) + 1j * random.randn(len(phase))) * 0.05
+	return (numpy.exp(1j * phase) + noise).astype(numpy.complex64)
+
+def packet_bursts(count=4):
+	random = numpy.random.RandomState(1)
+	bursts = []
+	for n in range(count):
+		bits = [0] * 16 + [int(c) for c in access_code] + list(random.randint(0, 2, 80)) + [0] * 16
+		bursts.append(fsk_burst(bits, n))
+	return bursts
+
+def packets_equal(a, b):
+	assert len(a) == len(b)
+	for packet_a, packet_b in zip(a, b):
+		assert packet_a[2:] == packet_b[2:]
+		assert numpy.array_equal(packet_a[0], packet_b[0])
+		assert numpy.array_equal(packet_a[1], packet_b[1])
+
+def packets_match(a, b):
+	# Bursts streamed back-to-back start clock recovery at another phase
+	# than a burst on its own, so may gain or lose a symbol at either end.
+	assert len(a) == len(b)
+	for packet_a, packet_b in zip(a, b):
+		assert numpy.array_equal(packet_a[0], packet_b[0])
+		assert numpy.array_equal(packet_a[1][:80], packet_b[1][:80])
+		assert abs(int(packet_a[2]) - int(packet_b[2])) <= 1
+
+def check_batched_matches_per_burst(engine):
+	bursts = packet_bursts()
+	batched = engine().demodulate(bursts)
+	assert all(len(packets) > 0 for packets in batched)
+	for burst, packets in zip(bursts, batched):
+		packets_equal(engine().demodulate([burst])[0], packets)
+
+def to_bits(s):
+	return numpy.array([int(c) for c in s], dtype=numpy.uint8)
+
+def test_repeated_packet_splits_at_each_code():
+	payloads = ['0011' * 20, '1101' * 20]
+	bits = to_bits('1111' + access_code + payloads[0] + access_code + payloads[1])
+	packets = access_code_packets(bits, access_code)
+	assert [''.join(map(str, packet[1])) for packet in packets] == payloads
+	assert [packet[2] for packet in packets] == [4 + 32, 4 + 32 + 80 + 32]
+
+@pytest.mark.parametrize('threshold', [0, 2])
+def test_periodic_code_gives_one_packet(threshold):
+	payload = '0011' * 18
+	bits = to_bits('01' * 20 + payload)
+	packets = access_code_packets(bits, '01010101', threshold)
+	assert len(packets) == 1
+	assert ''.join(map(str, packets[0][0])) == '01010101'
+	assert ''.join(map(str, packets[0][1])) == payload
+
+def test_short_payloads_are_dropped():
+	bits = to_bits(access_code + '0011' * 4 + access_code + '0011' * 4)
+	assert access_code_packets(bits, access_code) == []
+
+def numpy_engine():
+	return NumpyFSKDemodulator(sampling_rate, carrier_hz, symbol_rate, deviation, access_code)
+
+def test_numpy_fsk_finds_access_code():
+	packets = numpy_engine().demodulate_burst(packet_bursts(1)[0])
+	assert len(packets) == 1
+	assert ''.join(map(str, packets[0][0])) == access_code
+
+def test_numpy_fsk_batched_matches_per_burst():
+	check_batched_matches_per_burst(numpy_engine)
+
+def test_gnuradio_fsk_batched_matches_per_burst():
+	pytest.importorskip('gnuradio')
+	from tpms_fsk import FSKDemodulator
+	demodulator = FSKDemodulator(sampling_rate, carrier_hz, symbol_rate, deviation, access_code)
+	# Enough bursts for several flowgraph runs.
+	bursts = packet_bursts(int(demodulator.run_symbols() / 150) * 3)
+	batched = demodulator.demodulate(bursts)
+	assert all(len(packets) == 1 for packets in batched)
+	for burst, packets in zip(bursts, batched):
+		packets_match(demodulator.demodulate_burst(burst), packets)
+
+def test_interpolator_weights():
+	# mu = 0 and 1 give x(3) and x(4); mu and 1 - mu mirror each other.
+	assert list(interpolator_weights[0]) == [0, 0, 0, 1, 0, 0, 0, 0]
+	assert list(interpolator_weights[128]) == [0, 0, 0, 0, 1, 0, 0, 0]
+	assert numpy.array_equal(interpolator_weights[1:128], interpolator_weights[127:0:-1, ::-1])
+	assert numpy.allclose(interpolator_weights.sum(axis=1), 1, atol=2e-3)
+
+def test_numpy_fsk_matches_gnuradio():
+	pytest.importorskip('gnuradio')
+	from tpms_fsk import FSKDemodulator
+	bursts = packet_bursts()
+	expected = FSKDemodulator(sampling_rate, carrier_hz, symbol_rate, deviation, access_code).demodulate(bursts)
+	for packets, expected_packets in zip(numpy_engine().demodulate(bursts), expected):
+		packets_equal(packets, expected_packets)
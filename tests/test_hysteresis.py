@@ -0,0 +1,36 @@
+import numpy
+import pytest
+
+from burst_scan import hysteresis_counts
+
+def scalar_counts(spreads, count, timeout, threshold_rise, threshold_fall):
+	# The per-block rule from the original burst_detector.
+	threshold_rise = numpy.broadcast_to(threshold_rise, spreads.shape)
+	threshold_fall = numpy.broadcast_to(threshold_fall, spreads.shape)
+	result = []
+	for spread, rise, fall in zip(spreads, threshold_rise, threshold_fall):
+		if spread >= rise:
+			count = timeout
+		elif spread < fall:
+			count -= 1
+		result.append(count)
+	return numpy.array(result)
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('count', [-4, 0, 3])
+def test_matches_scalar_rule(seed, count):
+	spreads = numpy.random.RandomState(seed).uniform(0, 15, 500)
+	expected = scalar_counts(spreads, count, 3, 10, 5)
+	assert numpy.array_equal(hysteresis_counts(spreads, count, 3, 10, 5), expected)
+
+def test_matches_scalar_rule_with_per_block_thresholds():
+	random = numpy.random.RandomState(1)
+	spreads = random.uniform(0, 15, 500)
+	threshold_rise = random.uniform(8, 12, 500)
+	threshold_fall = threshold_rise / 2
+	expected = scalar_counts(spreads, 0, 5, threshold_rise, threshold_fall)
+	assert numpy.array_equal(hysteresis_counts(spreads, 0, 5, threshold_rise, threshold_fall), expected)
+
+def test_thresholds_are_inclusive():
+	spreads = numpy.array([10.0, 5.0, 4.999, 4.999])
+	assert list(hysteresis_counts(spreads, 0, 3, 10, 5)) == [3, 3, 2, 1]
@@ -0,0 +1,38 @@
+import numpy
+
+from packed_bits import PackedBits
+
+def random_strings(count=100, seed=0):
+	random = numpy.random.RandomState(seed)
+	return [''.join(random.choice(['0', '1'], random.randint(0, 70))) for n in range(count)]
+
+def test_string_round_trip():
+	for s in random_strings():
+		bits = PackedBits.from_string(s)
+		assert str(bits) == s
+		assert len(bits) == len(s)
+
+def test_slicing_matches_strings():
+	for s in random_strings():
+		bits = PackedBits.from_string(s)
+		for start, stop in ((0, None), (8, None), (3, 20), (16, 24), (5, 5)):
+			assert str(bits[start:stop]) == s[start:stop]
+			assert bits[start:stop] == PackedBits.from_string(s[start:stop])
+		for n in range(len(s)):
+			assert bits[n] == int(s[n])
+
+def test_order_and_hash_match_strings():
+	strings = random_strings()
+	packed = [PackedBits.from_string(s) for s in strings]
+	assert [str(bits) for bits in sorted(packed)] == sorted(strings)
+	assert len(set(packed)) == len(set(strings))
+
+def test_value():
+	bits = PackedBits.from_string('1011001110')
+	assert bits.value() == int('1011001110', 2)
+	assert bits.value(2, 9) == int('1100111', 2)
+
+def test_split_bytes():
+	s = '0011010110111'
+	bits = PackedBits.from_string(s)
+	assert list(bits.split_bytes(3)) == [int(s[3:11], 2), int(s[11:], 2)]
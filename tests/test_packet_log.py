@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+from packet_log import PacketLog, PacketLogWriter, text_to_log, log_to_text, payload_bytes_max
+
+lines = [
+	'2014-01-01T00:00:00+00:00 01010101001111 0011001111100101100 fsk 60000 30000 10000 burst_0_0.000000.dat',
+	'2014-01-01T00:00:01.250000+00:00 01010101001111 1 ask -50000 0 10000 burst_1_1.000000.dat',
+	'2014-01-01T00:00:02+00:00 0101 %s gfsk 1000 2000 19200 capture.cfile' % ('10' * (payload_bytes_max * 4)),
+]
+
+def test_text_log_round_trip(tmpdir):
+	path = str(tmpdir.join('packets.pkt'))
+	assert text_to_log(lines, path) == len(lines)
+	assert list(log_to_text(path)) == lines
+	log = PacketLog.load(path)
+	assert len(log) == len(lines)
+	assert log.packet(2)['modulation'] == 'gfsk'
+	assert len(log.payload(2)) == payload_bytes_max * 8
+
+def test_append_reuses_strings(tmpdir):
+	path = str(tmpdir.join('packets.pkt'))
+	text_to_log(lines[:2], path)
+	text_to_log(lines[:2], path)
+	assert list(log_to_text(path)) == lines[:2] * 2
+	with open(path + '.strings') as f:
+		assert len(f.read().split()) == 5
+
+def test_long_payload_is_refused(tmpdir):
+	path = str(tmpdir.join('packets.pkt'))
+	long_line = lines[0].replace('0011001111100101100', '1' * (payload_bytes_max * 8 + 1))
+	with pytest.raises(ValueError):
+		text_to_log([lines[0], long_line], path)
+	assert list(log_to_text(path)) == [lines[0]]
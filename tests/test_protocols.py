@@ -0,0 +1,91 @@
+import numpy
+
+from protocols import protocols
+from protocol_decode import ProtocolDecoder, decode_chunk, format_decoded
+
+def split_string_bytes(data, start_offset):
+	for n in range(start_offset, len(data), 8):
+		yield data[n:n+8]
+
+def crc8(data, poly=0x07):
+	register = 0
+	for byte in data:
+		register ^= byte
+		for n in range(8):
+			register = ((register << 1) ^ poly if register & 0x80 else register << 1) & 0xff
+	return register
+
+# The ride_1_decode.py and ride_2_decode.py rules these protocols replaced,
+# returning the printed fields (without the timestamp), or None.
+def reference_ride_1(payload):
+	payload_bytes_str = tuple(split_string_bytes(payload, 1))
+	payload_bytes = [int(v, 2) for v in payload_bytes_str]
+	if (6 + sum(payload_bytes[0:7])) & 0xff != payload_bytes[7]:
+		return None
+	return '%s %d %d %d' % (''.join(payload_bytes_str[0:4]), payload_bytes[4], payload_bytes[5], payload_bytes[6])
+
+def reference_ride_2(payload):
+	payload_bytes_str = tuple(split_string_bytes(payload, 5))
+	payload_bytes = [int(v, 2) for v in payload_bytes_str]
+	if crc8(payload_bytes[0:7]) != payload_bytes[7]:
+		return None
+	return '%s %.1f %d %d' % (''.join(payload_bytes_str[2:6]), payload_bytes[0] / 5.0, payload_bytes[1], payload_bytes[6])
+
+reference = {'ride_1': reference_ride_1, 'ride_2': reference_ride_2}
+
+def to_bits(values):
+	return ''.join('{:08b}'.format(value) for value in values)
+
+def synthetic_payloads(count=300, seed=0):
+	random = numpy.random.RandomState(seed)
+	payloads = []
+	for n in range(count):
+		data = [int(value) for value in random.randint(0, 256, 7)]
+		kind = n % 3
+		if kind == 0:
+			payload = random.choice(['0', '1']) + to_bits(data + [(6 + sum(data)) & 0xff])
+		elif kind == 1:
+			payload = ''.join(random.choice(['0', '1'], 5)) + to_bits(data + [crc8(data)])
+		else:
+			payload = ''.join(random.choice(['0', '1'], 69))
+		if n % 7 == 0:
+			# Corrupt one bit.
+			flip = random.randint(0, len(payload))
+			payload = payload[:flip] + '10'[int(payload[flip])] + payload[flip + 1:]
+		# At least 69 bits, so both protocols' fields are whole: the old
+		# decoders also compared a short trailing byte against the check.
+		payloads.append(payload + ''.join(random.choice(['0', '1'], random.randint(69 - len(payload), 9))))
+	return payloads
+
+def test_registry_has_ride_protocols():
+	assert list(protocols) == ['ride_1', 'ride_2']
+
+def test_decode_chunk_matches_ride_decoders():
+	packets = [{'payload': payload} for payload in synthetic_payloads()]
+	decoders = [ProtocolDecoder(protocols[name]) for name in protocols]
+
+	expected = []
+	for n, packet in enumerate(packets):
+		for name in protocols:
+			values = reference[name](packet['payload'])
+			if values is not None:
+				expected.append((n, name, values))
+
+	decoded = []
+	index = dict((id(packet), n) for n, packet in enumerate(packets))
+	for packet, decoder, values in decode_chunk(packets, decoders):
+		decoded.append((index[id(packet)], decoder.name, format_decoded(packet, decoder, values, show_protocol=False)))
+
+	assert len(expected) > 150
+	assert sorted(decoded) == sorted(expected)
+
+def test_invalid_symbols_are_skipped():
+	data = [1, 2, 3, 4, 5, 6, 7]
+	payload = '0' + to_bits(data + [(6 + sum(data)) & 0xff])
+	decoder = ProtocolDecoder(protocols['ride_1'])
+	symbols = numpy.array([[int(c) for c in payload]], dtype=numpy.uint8)
+	rows, columns = decoder.decode(symbols)
+	assert list(rows) == [0]
+	symbols[0, 10] = 2
+	rows, columns = decoder.decode(symbols)
+	assert len(rows) == 0
@@ -0,0 +1,36 @@
+import numpy
+
+from spectrum import LRUCache, fast_fft_size, burst_spectrum
+
+def test_lru_cache_evicts_least_recent():
+	made = []
+	def factory(key):
+		made.append(key)
+		return key * 2
+	cache = LRUCache(factory, capacity=2)
+	assert cache[1] == 2
+	assert cache[2] == 4
+	assert cache[1] == 2
+	cache[3]
+	assert len(cache) == 2
+	cache[2]
+	assert made == [1, 2, 3, 2]
+
+def test_fast_fft_size():
+	assert fast_fft_size(100) == 128
+	assert fast_fft_size(128) == 128
+	assert fast_fft_size(100, minimum_size=1024) == 1024
+
+def test_burst_spectrum_peak():
+	sampling_rate = 1000.0
+	n = numpy.arange(100)
+	data = numpy.exp(2j * numpy.pi * 250.0 / sampling_rate * n).astype(numpy.complex64)
+	spectrum = burst_spectrum(data)
+	assert len(spectrum) == 128
+	peak_hz = (numpy.argmax(numpy.abs(spectrum)) / float(len(spectrum)) - 0.5) * sampling_rate
+	assert abs(peak_hz - 250.0) < sampling_rate / len(spectrum)
+
+def test_burst_spectrum_ones():
+	spectrum = burst_spectrum(numpy.ones(100, 'complex64'), pad=False)
+	assert len(spectrum) == 100
+	assert numpy.argmax(numpy.abs(spectrum)) == 50
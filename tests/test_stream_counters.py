@@ -0,0 +1,53 @@
+from collections import Counter
+
+import numpy
+import pytest
+
+from stream_counters import SpaceSavingCounter, BloomFilter
+
+def zipf_stream(count, seed=0):
+	return numpy.random.RandomState(seed).zipf(1.5, count) % 1000
+
+def test_space_saving_error_bounds():
+	capacity = 50
+	stream = zipf_stream(20000)
+	counter = SpaceSavingCounter(capacity)
+	for key in stream:
+		counter.add(int(key))
+	exact = Counter(int(key) for key in stream)
+
+	assert len(counter) == capacity
+	tracked = {}
+	for key, count, error in counter.items():
+		assert exact[key] <= count <= exact[key] + error
+		assert error <= len(stream) // capacity
+		tracked[key] = count
+	for key, count in exact.items():
+		if count > len(stream) // capacity:
+			assert key in tracked
+
+def test_space_saving_exact_below_capacity():
+	counter = SpaceSavingCounter(10)
+	for key in 'abacabad':
+		counter.add(key)
+	assert sorted(counter.items()) == [('a', 4, 0), ('b', 2, 0), ('c', 1, 0), ('d', 1, 0)]
+
+@pytest.mark.parametrize('hash_count', [1, 4, 8])
+def test_bloom_false_positives(hash_count):
+	bit_count = 1 << 13
+	members = [('member %d' % n).encode('ascii') for n in range(1000)]
+	others = [('other %d' % n).encode('ascii') for n in range(20000)]
+
+	bloom = BloomFilter(bit_count, hash_count)
+	for key in members:
+		bloom.add(key)
+	assert all(bloom.add(key) for key in members)
+
+	false_positives = sum(key in bloom for key in others)
+
+	expected = (1 - numpy.exp(-hash_count * len(members) / float(bit_count))) ** hash_count
+	assert false_positives / float(len(others)) < 1.5 * expected + 0.002
+
+def test_bloom_hash_count_validated():
+	with pytest.raises(ValueError):
+		BloomFilter(1024, 0)
@@ -0,0 +1,127 @@
+import sys
+import types
+
+import numpy
+import pytest
+
+import numpy_fsk
+from test_demodulators import packet_bursts, packets_match, sampling_rate, carrier_hz, deviation, symbol_rate, access_code
+
+def fake_gnuradio():
+	# Just enough of the GNU Radio API to import tpms_fsk, for running its
+	# pure-Python parts where GNU Radio isn't installed.
+	class block(object):
+		def __init__(self, *args, **kwargs):
+			pass
+
+		def nitems_written(self, port):
+			return 0
+
+		def add_item_tag(self, *args):
+			pass
+
+	gr = types.ModuleType('gnuradio.gr')
+	gr.top_block = gr.sync_block = gr.basic_block = block
+	gr.pmt = types.ModuleType('pmt')
+	gr.pmt.string_to_symbol = lambda s: s
+	gr.pmt.from_long = lambda n: n
+	gr.sizeof_gr_complex = 8
+
+	gnuradio = types.ModuleType('gnuradio')
+	modules = {'gnuradio': gnuradio, 'gnuradio.gr': gr}
+	for name in ('blocks', 'digital', 'eng_notation', 'filter'):
+		modules['gnuradio.' + name] = types.ModuleType('gnuradio.' + name)
+	for name, module in modules.items():
+		if name != 'gnuradio':
+			setattr(gnuradio, name.split('.')[1], module)
+	return modules
+
+@pytest.fixture
+def tpms_fsk():
+	saved = set(sys.modules)
+	try:
+		import gnuradio
+	except ImportError:
+		sys.modules.update(fake_gnuradio())
+	import tpms_fsk
+	yield tpms_fsk
+	# Forget modules imported against the fake, so other tests don't see it.
+	for name in set(sys.modules) - saved:
+		if name.startswith('gnuradio') or name in ('tpms_fsk', 'packet', 'numpy_block'):
+			del sys.modules[name]
+
+def test_burst_demodulator_demodulate(tpms_fsk):
+	# demodulate() is engine-independent; demodulate_run() is stubbed.
+	demodulator = tpms_fsk.BurstDemodulator.__new__(tpms_fsk.BurstDemodulator)
+	demodulator.omega = 1.0
+	demodulator.padding = 64
+	demodulator.omega_relative_limit = 0.016
+	calls = []
+	runs = []
+	demodulator._callback = lambda burst_n, packets: calls.append((burst_n, packets))
+	demodulator.demodulate_run = lambda bursts: runs.append(len(bursts)) or [[len(burst)] for burst in bursts]
+	bursts = [numpy.zeros((n * 100,), dtype=numpy.complex64) for n in range(1, 6)]
+	assert demodulator.demodulate(bursts) == [[100], [200], [300], [400], [500]]
+	assert calls == [(0, [100]), (1, [200]), (2, [300]), (3, [400]), (4, [500])]
+	# Runs of at most 1000 symbols, padding included.
+	assert runs == [3, 1, 1]
+
+def streaming_demodulator(tpms_fsk):
+	# An FSKDemodulator whose flowgraph run() streams its source through the
+	# NumPy engine's blocks, as GNU Radio would.
+	engine = numpy_fsk.NumpyFSKDemodulator(sampling_rate, carrier_hz, symbol_rate, deviation, access_code)
+
+	class clock_recovery(object):
+		def set_omega(self, omega):
+			pass
+
+		def set_mu(self, mu):
+			pass
+
+	class StreamingDemodulator(tpms_fsk.BurstDemodulator):
+		def __init__(self):
+			self._access_code = access_code
+			self._access_code_threshold = 0
+			self._callback = None
+			self.omega = engine.omega
+			self.mu = engine.mu
+			self.padding = engine.padding
+			# Short runs, to split the test's bursts across several.
+			self.omega_relative_limit = 0.02
+			self.source = tpms_fsk.NumpySource([], engine.padding, numpy.complex64)
+			self.symbols = tpms_fsk.NumpySink(numpy.float32)
+			self.clock_recovery = clock_recovery()
+
+		def run(self):
+			data = numpy.empty((self.source.length,), dtype=numpy.complex64)
+			self.source.work(None, [data])
+			sub_pn = numpy_fsk.complex_to_mag(numpy_fsk.fir_filter_ccc(engine.taps_p, data)) - numpy_fsk.complex_to_mag(numpy_fsk.fir_filter_ccc(engine.taps_n, data))
+			self.symbols.work([numpy_fsk.clock_recovery_mm(sub_pn, engine.omega, engine.gain_omega, engine.mu, engine.gain_mu, engine.omega_relative_limit)], None)
+
+	return StreamingDemodulator(), engine
+
+def test_bursts_split_from_stream(tpms_fsk):
+	demodulator, engine = streaming_demodulator(tpms_fsk)
+	bursts = packet_bursts(12)
+	batched = demodulator.demodulate(bursts)
+	assert len(batched) == len(bursts)
+	for burst, packets in zip(bursts, batched):
+		assert len(packets) == 1
+		packets_match(engine.demodulate_burst(burst), packets)
+
+def test_decode_batch_with_numpy_engine(tpms_fsk):
+	packet_info = {
+		'sampling_rate': sampling_rate,
+		'modulation': 'fsk',
+		'carrier': carrier_hz,
+		'deviation': deviation,
+		'symbol_rate': symbol_rate,
+		'preamble': access_code,
+		'access_code_threshold': 0,
+		'engine': 'numpy',
+	}
+	bursts = packet_bursts(2)
+	batch = [(n, 'burst_%d.dat' % n, burst) for n, burst in enumerate(bursts)]
+	packets = tpms_fsk.decode_batch(packet_info, batch)
+	assert [packet['timestamp'] for packet in packets] == [0, 1]
+	assert all(packet['access_code'] == access_code and len(packet['payload']) > 0 for packet in packets)